@@ -1,7 +1,11 @@
 import os
+import uuid
 import streamlit as st
 from preprocessor import FilePreprocessor
 from rag_pipeline import RAGPipeline
+from ingestion_registry import IngestionRegistry
+from collection_manager import CollectionManager
+from document_manifest import DocumentManifest
 from PIL import Image
 import io
 
@@ -14,6 +18,9 @@ if 'chat_history' not in st.session_state:
     st.session_state.chat_history = []
 if 'show_history' not in st.session_state:
     st.session_state.show_history = False
+if 'collection_name' not in st.session_state:
+    # Each browser session gets its own Chroma collection
+    st.session_state.collection_name = f"session_{uuid.uuid4().hex}"
 
 
 # Set page config
@@ -63,10 +70,70 @@ st.markdown("""
     </style>
 """, unsafe_allow_html=True)
 
-preprocessor = FilePreprocessor()
+# Chunk length in embedding-model tokens (None uses the model's full sequence limit)
+CHUNK_TOKENS = None
+CHUNK_OVERLAP_TOKENS = 16
+
+@st.cache_resource
+def get_registry() -> IngestionRegistry:
+    return IngestionRegistry()
+
+
+@st.cache_resource
+def get_collection_manager() -> CollectionManager:
+    manager = CollectionManager()
+    manager.on_evict(get_registry().forget_collection)
+    manager.on_evict(get_manifest().drop_collection)
+    return manager
+
+
+@st.cache_resource
+def get_manifest() -> DocumentManifest:
+    return DocumentManifest()
+
+
+@st.cache_resource
+def get_preprocessor() -> FilePreprocessor:
+    # Shared so its HTTP connection pool and OCR settings outlive each rerun
+    return FilePreprocessor(chunk_tokens=CHUNK_TOKENS, chunk_overlap_tokens=CHUNK_OVERLAP_TOKENS)
+
+
+def track_collection():
+    """Record this session's collection size and evict idle or excess ones."""
+    collection_name = st.session_state.collection_name
+    collection_manager.touch(
+        collection_name, st.session_state.rag_pipeline.vector_count()
+    )
+    collection_manager.evict(protect=[collection_name])
+
+
+def show_ingest_stats(chunk_stats=None):
+    stats = st.session_state.rag_pipeline.last_ingest_stats
+    st.caption(
+        f"Added {stats['added']}, removed {stats['deleted']}, kept {stats['unchanged']} chunks "
+        f"({stats['chunks_per_sec']:.1f} chunks/s)"
+    )
+    if chunk_stats is not None and chunk_stats.lengths:
+        summary = chunk_stats.summary()
+        st.caption(
+            f"Chunk length {summary['min_tokens']}–{summary['max_tokens']} tokens "
+            f"(mean {summary['mean_tokens']:.0f}), {summary['truncation_rate']:.1%} truncated"
+        )
+
+
+preprocessor = get_preprocessor()
+registry = get_registry()
+collection_manager = get_collection_manager()
 UPLOAD_FOLDER = 'uploads'
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 
+# A session that sat idle past the TTL has lost its collection to eviction
+if (st.session_state.rag_pipeline is not None
+        and not collection_manager.contains(st.session_state.collection_name)):
+    st.session_state.rag_pipeline = None
+    st.session_state.document_processed = False
+    st.session_state.collection_name = f"session_{uuid.uuid4().hex}"
+
 # Main UI
 col1, col2 = st.columns([1.2, 0.2])
 with col1:
@@ -107,23 +174,45 @@ with st.sidebar:
         )
     
         if uploaded_file is not None:
-            file_path = os.path.join(UPLOAD_FOLDER, uploaded_file.name)
-            with open(file_path, "wb") as f:
-                f.write(uploaded_file.getbuffer())
-            
-            try:
-                with st.spinner("Processing document..."):
-                    #documents = preprocessor.process_file(file_path)
-                    new_documents = preprocessor.process_file(file_path)
+            # Every rerun sees the upload again, so skip content that is already indexed
+            file_bytes = uploaded_file.getvalue()
+            cache_key = registry.make_key(
+                file_bytes, CHUNK_TOKENS, CHUNK_OVERLAP_TOKENS,
+                RAGPipeline.EMBEDDING_MODEL, st.session_state.collection_name
+            )
 
+            try:
+                if registry.lookup(cache_key) is not None:
                     if st.session_state.rag_pipeline is None:
-                        st.session_state.rag_pipeline = RAGPipeline()
-                        st.session_state.rag_pipeline.initialize_from_documents(new_documents)
-                    else:
-                        st.session_state.rag_pipeline.add_documents(new_documents)
-                        
+                        st.session_state.rag_pipeline = RAGPipeline(st.session_state.collection_name)
+                        st.session_state.rag_pipeline.load_persisted()
+                    collection_manager.touch(st.session_state.collection_name)
                     st.session_state.document_processed = True
-                    st.success("✅ Document processed successfully!")
+                    st.info("♻️ Document already indexed (cache hit)")
+                else:
+                    file_path = os.path.join(UPLOAD_FOLDER, uploaded_file.name)
+                    with open(file_path, "wb") as f:
+                        f.write(file_bytes)
+
+                    with st.spinner("Processing document..."):
+                        chunk_stats = preprocessor.new_chunk_stats()
+                        new_documents = preprocessor.iter_documents(file_path, stats=chunk_stats)
+
+                        if st.session_state.rag_pipeline is None:
+                            st.session_state.rag_pipeline = RAGPipeline(st.session_state.collection_name)
+                            st.session_state.rag_pipeline.load_persisted()
+                        # Re-uploading an edited file replaces only the chunks that changed
+                        summary = st.session_state.rag_pipeline.update_source(file_path, new_documents)
+
+                        track_collection()
+                        registry.record(cache_key, {
+                            "file_name": uploaded_file.name,
+                            "collection": st.session_state.collection_name,
+                            **summary
+                        })
+                        st.session_state.document_processed = True
+                        st.success("✅ Document processed successfully!")
+                        show_ingest_stats(chunk_stats)
                     
                 
             except Exception as e:
@@ -137,15 +226,17 @@ with st.sidebar:
             else:
                 try:
                     with st.spinner("Processing URL content..."):
-                        new_documents = preprocessor.process_file(url, is_url=True)
+                        chunk_stats = preprocessor.new_chunk_stats()
+                        new_documents = preprocessor.iter_documents(url, is_url=True, stats=chunk_stats)
                         if st.session_state.rag_pipeline is None:
-                            st.session_state.rag_pipeline = RAGPipeline()
-                            st.session_state.rag_pipeline.initialize_from_documents(new_documents)
-                        else:
-                            st.session_state.rag_pipeline.add_documents(new_documents)
-                            
+                            st.session_state.rag_pipeline = RAGPipeline(st.session_state.collection_name)
+                            st.session_state.rag_pipeline.load_persisted()
+                        st.session_state.rag_pipeline.update_source(url, new_documents)
+
+                        track_collection()
                         st.session_state.document_processed = True
                         st.success("✅ Document processed successfully!")
+                        show_ingest_stats(chunk_stats)
                         
                     
                 except Exception as e:
@@ -173,28 +264,62 @@ question = st.text_input(
     placeholder="Enter your question about the uploaded document"
 )
 
+use_sql = False
+if (st.session_state.rag_pipeline is not None
+        and st.session_state.rag_pipeline.has_tabular_sources()):
+    use_sql = st.checkbox("📊 Answer with SQL over uploaded tables", key="use_sql")
+
 if st.button("Get Answer", type="primary"):
     if not question:
         st.warning("⚠️ Please enter a question")
     elif not st.session_state.document_processed:
         st.warning("⚠️ Please upload and process a document first")
+    elif use_sql:
+        with st.spinner("🧮 Querying tables..."):
+            collection_manager.touch(st.session_state.collection_name)
+            st.session_state.chat_history.append({"role": "user", "content": question})
+            result = st.session_state.rag_pipeline.structured_query(question)
+            st.session_state.chat_history.append({"role": "bot", "content": result['answer']})
+            st.subheader("📝 Answer:")
+            st.markdown(f"<div style='background-color: #4a4a4a; padding: 15px; border-radius: 5px;'>{result['answer']}</div>", 
+                        unsafe_allow_html=True)
+            if result['sql']:
+                st.subheader("🧮 SQL Used:")
+                st.code(result['sql'], language="sql")
     else:
-        with st.spinner("🔍 Searching for answer..."):
-            try:
-                st.session_state.chat_history.append({"role": "user", "content": question})
-                result = st.session_state.rag_pipeline.query(question)
-                st.session_state.chat_history.append({"role": "bot", "content": result['answer']})
-                st.subheader("📝 Answer:")
-                st.markdown(f"<div style='background-color: #4a4a4a; padding: 15px; border-radius: 5px;'>{result['answer']}</div>", 
-                            unsafe_allow_html=True)
-                st.subheader("🔍 Context Used:")
-                st.markdown(f"<div class='context-box'>{result['context']}</div>", unsafe_allow_html=True)
-                
-                # Rerun to update the chat history display
-                #st.rerun()
-                
-            except Exception as e:
-                st.error(f"❌ Error: {str(e)}")
+        try:
+            collection_manager.touch(st.session_state.collection_name)
+            st.session_state.chat_history.append({"role": "user", "content": question})
+            events = st.session_state.rag_pipeline.stream_query(question)
+            with st.spinner("🔍 Searching for answer..."):
+                # Retrieval is done once the context event arrives
+                context_event = next(events)
+
+            # Render tokens as they arrive so the wait is only time-to-first-token
+            st.subheader("📝 Answer:")
+            answer_box = st.empty()
+            answer = ""
+            for event in events:
+                if event["type"] == "token":
+                    answer += event["text"]
+                    answer_box.markdown(f"<div style='background-color: #4a4a4a; padding: 15px; border-radius: 5px;'>{answer}▌</div>", 
+                                        unsafe_allow_html=True)
+                elif event["type"] == "done":
+                    answer = event["answer"]
+            answer_box.markdown(f"<div style='background-color: #4a4a4a; padding: 15px; border-radius: 5px;'>{answer}</div>", 
+                                unsafe_allow_html=True)
+            st.session_state.chat_history.append({"role": "bot", "content": answer})
+
+            if context_event.get('cache'):
+                st.caption(f"♻️ Answered from the {context_event['cache']} query cache")
+            st.subheader("🔍 Context Used:")
+            st.markdown(f"<div class='context-box'>{context_event['context']}</div>", unsafe_allow_html=True)
+            
+            # Rerun to update the chat history display
+            #st.rerun()
+            
+        except Exception as e:
+            st.error(f"❌ Error: {str(e)}")
 
             
             
@@ -0,0 +1,144 @@
+"""Recall-vs-latency benchmark of the local ANN backend against exact search.
+
+Examples:
+    python benchmark_ann.py --synthetic 100000
+    python benchmark_ann.py --collection company_docs --index hnsw ivf --dtype float32 int8
+"""
+import argparse
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+import numpy as np
+from langchain_core.documents import Document
+from local_vector_store import LocalVectorStore
+
+
+def synthetic_vectors(count: int, dim: int, clusters: int = 200, seed: int = 0) -> np.ndarray:
+    """Clustered unit vectors; uniform noise would be unrealistically hard for any ANN index."""
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(clusters, dim)).astype(np.float32)
+    vectors = centers[rng.integers(0, clusters, count)] + rng.normal(scale=0.5, size=(count, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def collection_vectors(collection: str, persist_directory: str, page: int = 10_000) -> np.ndarray:
+    """Every embedding stored in a Chroma collection."""
+    import chromadb
+    stored = chromadb.PersistentClient(path=persist_directory).get_collection(collection)
+    batches = []
+    offset = 0
+    while True:
+        found = stored.get(include=["embeddings"], limit=page, offset=offset)
+        if not len(found["ids"]):
+            break
+        batches.append(np.asarray(found["embeddings"], dtype=np.float32))
+        offset += len(found["ids"])
+    if not batches:
+        raise ValueError(f"Collection {collection} has no vectors")
+    return np.concatenate(batches)
+
+
+def build(directory: Path, vectors: np.ndarray, index: str, dtype: str,
+          batch_size: int = 1000, **options) -> LocalVectorStore:
+    store = LocalVectorStore(str(directory), index=index, dtype=dtype, **options)
+    for start in range(0, len(vectors), batch_size):
+        stop = min(start + batch_size, len(vectors))
+        store.upsert(
+            [str(i) for i in range(start, stop)],
+            vectors[start:stop],
+            [Document(page_content="") for _ in range(start, stop)]
+        )
+    if index == "ivf":
+        store.train_ivf()
+    return store
+
+
+def measure(store: LocalVectorStore, queries: np.ndarray, truth: List[set], k: int, exact: bool = False) -> Dict:
+    latencies, recalls = [], []
+    for query, expected in zip(queries, truth):
+        started = time.perf_counter()
+        hits = store.exact_search(query, k) if exact else store.search_ordinals(query, k)
+        latencies.append(time.perf_counter() - started)
+        recalls.append(len(expected & {ordinal for ordinal, _ in hits}) / k)
+    latencies_ms = np.array(latencies) * 1000
+    return {
+        "recall": float(np.mean(recalls)),
+        "p50_ms": float(np.percentile(latencies_ms, 50)),
+        "p95_ms": float(np.percentile(latencies_ms, 95))
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark local HNSW/IVF settings against exact search.")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--synthetic", type=int, metavar="N", help="benchmark on N clustered random vectors")
+    source.add_argument("--collection", help="benchmark on the embeddings of a Chroma collection")
+    parser.add_argument("--persist-directory", default="./chroma_db")
+    parser.add_argument("--dim", type=int, default=768, help="dimension of synthetic vectors")
+    parser.add_argument("--queries", type=int, default=200, help="held-out vectors used as queries")
+    parser.add_argument("-k", type=int, default=10)
+    parser.add_argument("--index", nargs="+", default=["hnsw", "ivf"], choices=["hnsw", "ivf"])
+    parser.add_argument("--dtype", nargs="+", default=["float32"], choices=["float32", "float16", "int8", "binary"])
+    parser.add_argument("--rescore-factor", type=int, default=None,
+                        help="candidates per result rescored in float32 (default: 4 for int8, 10 for binary)")
+    parser.add_argument("--no-rescore", action="store_true",
+                        help="rank int8/binary results by the quantized vectors only")
+    parser.add_argument("--m", type=int, default=16, help="HNSW links per node")
+    parser.add_argument("--ef-construction", type=int, default=100)
+    parser.add_argument("--ef", type=int, nargs="+", default=[16, 32, 64, 128, 256], help="HNSW ef_search values")
+    parser.add_argument("--nlist", type=int, default=None, help="IVF lists (default: 4*sqrt(N))")
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32], help="IVF nprobe values")
+    args = parser.parse_args(argv)
+
+    if args.synthetic:
+        vectors = synthetic_vectors(args.synthetic + args.queries, args.dim)
+    else:
+        vectors = collection_vectors(args.collection, args.persist_directory)
+    if len(vectors) <= args.queries:
+        parser.error(f"need more than {args.queries} vectors, got {len(vectors)}")
+    rng = np.random.default_rng(1)
+    order = rng.permutation(len(vectors))
+    queries, corpus = vectors[order[:args.queries]], vectors[order[args.queries:]]
+    print(f"{len(corpus)} vectors of dim {corpus.shape[1]}, {len(queries)} queries, recall@{args.k}\n")
+
+    # Ground truth is exhaustive float32 search over the unquantized vectors
+    normalized = corpus / np.maximum(np.linalg.norm(corpus, axis=1, keepdims=True), 1e-12)
+    truth = [set(np.argsort(normalized @ q)[::-1][:args.k].tolist()) for q in queries]
+
+    print(f"{'index':<6} {'dtype':<8} {'setting':<12} {'recall':>7} {'p50 ms':>8} {'p95 ms':>8} "
+          f"{'build s':>8} {'vector MB':>10}")
+    with tempfile.TemporaryDirectory() as workdir:
+        for dtype in args.dtype:
+            for index in args.index:
+                started = time.perf_counter()
+                store = build(
+                    Path(workdir) / f"{index}_{dtype}", corpus, index, dtype,
+                    m=args.m, ef_construction=args.ef_construction, nlist=args.nlist,
+                    rescore=False if args.no_rescore else None, rescore_factor=args.rescore_factor
+                )
+                build_seconds = time.perf_counter() - started
+                megabytes = store.memory_bytes() / 1024 ** 2
+
+                if index == args.index[0]:
+                    # Quantized storage loses a little recall even without an index
+                    exact = measure(store, queries, truth, args.k, exact=True)
+                    print(f"{'flat':<6} {dtype:<8} {'exact':<12} {exact['recall']:>7.3f} {exact['p50_ms']:>8.2f} "
+                          f"{exact['p95_ms']:>8.2f} {'-':>8} {megabytes:>10.1f}")
+                if index == "hnsw":
+                    settings = [("ef_search", ef) for ef in args.ef]
+                else:
+                    settings = [("nprobe", nprobe) for nprobe in args.nprobe]
+                for name, value in settings:
+                    setattr(store, name, value)
+                    result = measure(store, queries, truth, args.k)
+                    print(f"{index:<6} {dtype:<8} {f'{name}={value}':<12} {result['recall']:>7.3f} "
+                          f"{result['p50_ms']:>8.2f} {result['p95_ms']:>8.2f} {build_seconds:>8.1f} "
+                          f"{megabytes:>10.1f}")
+                store.drop()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,74 @@
+from typing import Dict, List, Optional
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+# Regexes, coarsest boundary first; the splitter only falls back to finer ones when a piece is too long
+SENTENCE_SEPARATORS = [r"\n", r"\. ", r"\? ", r"! ", r"; ", r", ", r" ", ""]
+SEPARATORS = {
+    "text": [r"\n\n"] + SENTENCE_SEPARATORS,
+    # Split before the "#" marker so a heading opens its own chunk instead of ending the previous one
+    "docx": [r"\n(?=# )", r"\n(?=## )", r"\n(?=### )", r"\n(?=#### )"] + SENTENCE_SEPARATORS,
+}
+
+# Special tokens the encoder adds around every input ([CLS]/[SEP] or <s>/</s>)
+SPECIAL_TOKENS = 2
+
+
+class ChunkStats:
+    """Token length statistics for the chunks produced by one ingestion."""
+
+    def __init__(self, max_tokens: int):
+        self.max_tokens = max_tokens
+        self.lengths: List[int] = []
+
+    def record(self, n_tokens: int):
+        self.lengths.append(n_tokens)
+
+    def summary(self) -> Dict:
+        if not self.lengths:
+            return {"chunks": 0, "mean_tokens": 0.0, "max_tokens": 0,
+                    "min_tokens": 0, "truncated": 0, "truncation_rate": 0.0}
+        truncated = sum(n + SPECIAL_TOKENS > self.max_tokens for n in self.lengths)
+        return {
+            "chunks": len(self.lengths),
+            "mean_tokens": sum(self.lengths) / len(self.lengths),
+            "max_tokens": max(self.lengths),
+            "min_tokens": min(self.lengths),
+            "truncated": truncated,
+            "truncation_rate": truncated / len(self.lengths)
+        }
+
+
+class TokenChunker:
+    """Splits text by embedding-model tokens along a per-format separator hierarchy."""
+
+    def __init__(self, tokenizer,
+                 max_tokens: int,
+                 chunk_tokens: Optional[int] = None,
+                 overlap_tokens: int = 16):
+        self.tokenizer = tokenizer
+        # Anything past the model's sequence limit is silently dropped when embedding
+        self.max_tokens = max_tokens
+        self.chunk_tokens = min(chunk_tokens or max_tokens, max_tokens) - SPECIAL_TOKENS
+        self.overlap_tokens = min(overlap_tokens, self.chunk_tokens // 2)
+        self._splitters: Dict[str, RecursiveCharacterTextSplitter] = {}
+
+    def length(self, text: str) -> int:
+        """Length of a text in model tokens, excluding special tokens."""
+        return len(self.tokenizer.encode(text, add_special_tokens=False))
+
+    def split_text(self, text: str, fmt: str = "text") -> List[str]:
+        splitter = self._splitters.get(fmt)
+        if splitter is None:
+            splitter = RecursiveCharacterTextSplitter(
+                separators=SEPARATORS.get(fmt, SEPARATORS["text"]),
+                chunk_size=self.chunk_tokens,
+                chunk_overlap=self.overlap_tokens,
+                length_function=self.length,
+                keep_separator="end",
+                is_separator_regex=True
+            )
+            self._splitters[fmt] = splitter
+        return splitter.split_text(text)
+
+    def new_stats(self) -> ChunkStats:
+        return ChunkStats(self.max_tokens)
@@ -0,0 +1,110 @@
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional
+from vector_store import VECTOR_BACKENDS, create_vector_store
+
+
+class CollectionManager:
+    """Tracks per-session vector collections and evicts idle or excess ones."""
+
+    def __init__(self, persist_directory: str = "./chroma_db",
+                 ttl_seconds: float = 24 * 60 * 60,
+                 max_total_vectors: int = 1_000_000,
+                 filename: str = "collections.json",
+                 vector_backend: str = "chroma"):
+        if vector_backend not in VECTOR_BACKENDS:
+            raise ValueError(f"Unsupported vector backend: {vector_backend}")
+        self.persist_directory = persist_directory
+        self.ttl_seconds = ttl_seconds
+        self.max_total_vectors = max_total_vectors
+        # Must match the pipelines' backend so eviction frees the storage they actually use
+        self.vector_backend = vector_backend
+        self.path = Path(persist_directory) / filename
+        self._lock = threading.Lock()
+        self._collections = self._load()
+        self._evict_callbacks: List[Callable[[str], None]] = []
+
+    def on_evict(self, callback: Callable[[str], None]):
+        """Register a callback that receives the name of each evicted collection."""
+        self._evict_callbacks.append(callback)
+
+    def contains(self, name: str) -> bool:
+        """Whether a collection is tracked and has not been evicted."""
+        with self._lock:
+            return name in self._collections
+
+    def touch(self, name: str, vector_count: Optional[int] = None):
+        """Record an access to a collection and optionally its current size."""
+        with self._lock:
+            entry = self._collections.setdefault(name, {"vectors": 0})
+            entry["last_access"] = time.time()
+            if vector_count is not None:
+                entry["vectors"] = vector_count
+            self._save()
+
+    def total_vectors(self) -> int:
+        with self._lock:
+            return sum(entry["vectors"] for entry in self._collections.values())
+
+    def evict(self, protect: Iterable[str] = ()) -> List[str]:
+        """Drop collections idle past the TTL, then LRU ones over the vector cap."""
+        protected = set(protect)
+        now = time.time()
+        evicted = []
+        with self._lock:
+            candidates = sorted(
+                (name for name in self._collections if name not in protected),
+                key=lambda name: self._collections[name]["last_access"]
+            )
+            total = sum(entry["vectors"] for entry in self._collections.values())
+            for name in candidates:
+                idle = now - self._collections[name]["last_access"]
+                if idle <= self.ttl_seconds and total <= self.max_total_vectors:
+                    # Candidates are ordered oldest first, so nothing later qualifies
+                    break
+                total -= self._collections[name]["vectors"]
+                self._delete(name)
+                evicted.append(name)
+            if evicted:
+                self._save()
+
+        for name in evicted:
+            for callback in self._evict_callbacks:
+                callback(name)
+        return evicted
+
+    def drop(self, name: str):
+        """Delete a collection immediately, e.g. when its session is cleared."""
+        with self._lock:
+            self._delete(name)
+            self._save()
+        for callback in self._evict_callbacks:
+            callback(name)
+
+    def _delete(self, name: str):
+        try:
+            # Opened without embeddings or search settings; it is only dropped
+            create_vector_store(self.vector_backend, name, self.persist_directory, None).drop()
+        except Exception:
+            # Already gone from the store; only the bookkeeping needs updating
+            pass
+        self._collections.pop(name, None)
+
+    def _load(self) -> Dict:
+        if not self.path.exists():
+            return {}
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return {}
+
+    def _save(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix(".tmp")
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self._collections, f)
+        os.replace(tmp_path, self.path)
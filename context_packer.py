@@ -0,0 +1,146 @@
+import re
+from typing import Callable, List, Optional, Sequence
+import numpy as np
+from langchain_core.documents import Document
+
+# Sentence ends followed by whitespace; the whitespace stays with the next sentence
+SENTENCE_BOUNDARY = re.compile(r"(?<=[.!?;:。！？])\s+|\n+")
+MIN_TEXT_OVERLAP = 40
+
+
+def mmr_select(query_vector: Sequence[float],
+               vectors: Sequence[Sequence[float]],
+               k: int,
+               lambda_mult: float = 0.7) -> List[int]:
+    """Indices of k vectors picked by maximal marginal relevance.
+
+    Each step takes the candidate with the best trade-off between similarity to
+    the query and dissimilarity to what was already picked.
+    """
+    matrix = np.asarray(vectors, dtype=np.float32)
+    if not len(matrix):
+        return []
+    query = np.asarray(query_vector, dtype=np.float32)
+    matrix = matrix / np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+    query = query / max(float(np.linalg.norm(query)), 1e-12)
+
+    relevance = matrix @ query
+    selected = [int(np.argmax(relevance))]
+    redundancy = matrix @ matrix[selected[0]]
+    while len(selected) < min(k, len(matrix)):
+        scores = lambda_mult * relevance - (1.0 - lambda_mult) * redundancy
+        scores[selected] = -np.inf
+        best = int(np.argmax(scores))
+        selected.append(best)
+        redundancy = np.maximum(redundancy, matrix @ matrix[best])
+    return selected
+
+
+def merge_overlapping(docs: List[Document]) -> List[Document]:
+    """Merge chunks of the same source whose spans overlap, keeping relevance order.
+
+    Passes repeat until no pair overlaps, so a chunk that bridges two earlier ones
+    joins all three; a merged chunk sits where its most relevant part was.
+    """
+    merged = list(docs)
+    changed = True
+    while changed:
+        changed = False
+        i = 0
+        while i < len(merged):
+            j = i + 1
+            while j < len(merged):
+                combined = _merge_pair(merged[i], merged[j])
+                if combined is None:
+                    j += 1
+                    continue
+                merged[i] = combined
+                del merged[j]
+                changed = True
+                j = i + 1
+            i += 1
+    return merged
+
+
+def _merge_pair(a: Document, b: Document) -> Optional[Document]:
+    if a.metadata.get("source") != b.metadata.get("source"):
+        return None
+    spans = [doc.metadata.get(key) for doc in (a, b) for key in ("start_index", "end_index")]
+    if all(isinstance(value, int) for value in spans):
+        return _merge_spans(a, b)
+
+    # Chunks without offsets overlap by the splitter's chunk_overlap characters
+    text_a, text_b = a.page_content, b.page_content
+    if text_b in text_a:
+        return a
+    if text_a in text_b:
+        return b
+    for first, second in ((a, b), (b, a)):
+        text = _join_on_overlap(first.page_content, second.page_content)
+        if text is not None:
+            return Document(page_content=text, metadata=dict(first.metadata))
+    return None
+
+
+def _merge_spans(a: Document, b: Document) -> Optional[Document]:
+    first, second = sorted((a, b), key=lambda doc: doc.metadata["start_index"])
+    first_end = first.metadata["end_index"]
+    if second.metadata["start_index"] > first_end:
+        return None
+    text = first.page_content
+    if second.metadata["end_index"] > first_end:
+        text += second.page_content[first_end - second.metadata["start_index"]:]
+    metadata = dict(first.metadata)
+    metadata["end_index"] = max(first_end, second.metadata["end_index"])
+    if "page_end" in second.metadata:
+        metadata["page_end"] = max(first.metadata.get("page_end", 0), second.metadata["page_end"])
+    return Document(page_content=text, metadata=metadata)
+
+
+def _join_on_overlap(first: str, second: str) -> Optional[str]:
+    """first + second without the text second repeats from first's end, if it does."""
+    probe = second[:MIN_TEXT_OVERLAP]
+    if len(probe) < MIN_TEXT_OVERLAP:
+        return None
+    position = first.find(probe)
+    while position >= 0:
+        if second.startswith(first[position:]):
+            return first + second[len(first) - position:]
+        position = first.find(probe, position + 1)
+    return None
+
+
+def truncate_to_sentences(text: str, budget: int, length: Callable[[str], int]) -> str:
+    """Longest prefix of whole sentences that fits in the budget."""
+    if length(text) <= budget:
+        return text
+    kept = ""
+    for match in SENTENCE_BOUNDARY.finditer(text):
+        candidate = text[:match.start()]
+        if length(candidate) > budget:
+            break
+        kept = candidate
+    return kept.rstrip()
+
+
+def pack_context(docs: List[Document],
+                 budget: Optional[int],
+                 length: Callable[[str], int]) -> List[Document]:
+    """Merge overlapping chunks, then keep them in order until the token budget is spent."""
+    merged = merge_overlapping(docs)
+    if budget is None:
+        return merged
+    packed = []
+    remaining = budget
+    for doc in merged:
+        size = length(doc.page_content)
+        if size <= remaining:
+            packed.append(doc)
+            remaining -= size
+            continue
+        # The first chunk that does not fit is cut at a sentence end; the rest are dropped
+        text = truncate_to_sentences(doc.page_content, remaining, length)
+        if text:
+            packed.append(Document(page_content=text, metadata={**doc.metadata, "truncated": True}))
+        break
+    return packed
@@ -0,0 +1,67 @@
+import hashlib
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Iterable, List, Set
+
+
+def chunk_id(source: str, text: str) -> str:
+    """Deterministic chunk ID from its source and the hash of its text."""
+    text_hash = hashlib.sha256(text.encode('utf-8')).hexdigest()
+    return hashlib.sha256(f"{source}\n{text_hash}".encode('utf-8')).hexdigest()[:32]
+
+
+class DocumentManifest:
+    """Records which chunk IDs belong to each source in each collection."""
+
+    def __init__(self, persist_directory: str = "./chroma_db",
+                 filename: str = "manifest.sqlite"):
+        self.path = Path(persist_directory) / filename
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS chunks ("
+            "collection TEXT NOT NULL, source TEXT NOT NULL, chunk_id TEXT NOT NULL, "
+            "PRIMARY KEY (collection, source, chunk_id))"
+        )
+        self._conn.commit()
+
+    def get_ids(self, collection: str, source: str) -> Set[str]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT chunk_id FROM chunks WHERE collection = ? AND source = ?",
+                (collection, source)
+            ).fetchall()
+        return {row[0] for row in rows}
+
+    def add_ids(self, collection: str, source: str, ids: Iterable[str]):
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO chunks (collection, source, chunk_id) VALUES (?, ?, ?)",
+                [(collection, source, chunk) for chunk in ids]
+            )
+            self._conn.commit()
+
+    def remove_ids(self, collection: str, source: str, ids: Iterable[str]):
+        with self._lock:
+            self._conn.executemany(
+                "DELETE FROM chunks WHERE collection = ? AND source = ? AND chunk_id = ?",
+                [(collection, source, chunk) for chunk in ids]
+            )
+            self._conn.commit()
+
+    def sources(self, collection: str) -> List[str]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT DISTINCT source FROM chunks WHERE collection = ? ORDER BY source",
+                (collection,)
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def drop_collection(self, collection: str):
+        """Forget every source of a collection, e.g. after it was evicted."""
+        with self._lock:
+            self._conn.execute("DELETE FROM chunks WHERE collection = ?", (collection,))
+            self._conn.commit()
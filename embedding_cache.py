@@ -0,0 +1,143 @@
+import hashlib
+import sqlite3
+import threading
+import time
+from array import array
+from pathlib import Path
+from typing import Dict, List, Optional
+
+
+class EmbeddingCache:
+    """SQLite-backed cache of chunk embeddings with size-based LRU eviction."""
+
+    def __init__(self, persist_directory: str = "./chroma_db",
+                 max_bytes: int = 1024 ** 3,
+                 filename: str = "embedding_cache.sqlite"):
+        self.path = Path(persist_directory) / filename
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            "key TEXT PRIMARY KEY, vector BLOB NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_embeddings_last_used ON embeddings(last_used)"
+        )
+        self._conn.commit()
+        # Summed once here and then kept up to date, so writes never scan the table
+        self._entries, self._bytes = self._measure()
+
+    @staticmethod
+    def make_key(model_name: str, normalize: bool, text: str) -> str:
+        """Key an embedding by model, normalization and chunk text hash."""
+        text_hash = hashlib.sha256(text.encode('utf-8')).hexdigest()
+        return f"{model_name}:{int(normalize)}:{text_hash}"
+
+    def get_many(self, model_name: str, normalize: bool,
+                 texts: List[str]) -> List[Optional[List[float]]]:
+        """Return cached vectors in input order, None where a text is missing."""
+        keys = [self.make_key(model_name, normalize, text) for text in texts]
+        found: Dict[str, List[float]] = {}
+        with self._lock:
+            # Stay well under SQLite's bound-parameter limit
+            for start in range(0, len(keys), 500):
+                batch = keys[start:start + 500]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})",
+                    batch
+                ).fetchall()
+                for key, blob in rows:
+                    found[key] = array('f', blob).tolist()
+            if found:
+                now = time.time()
+                self._conn.executemany(
+                    "UPDATE embeddings SET last_used = ? WHERE key = ?",
+                    [(now, key) for key in found]
+                )
+                self._conn.commit()
+
+        vectors = [found.get(key) for key in keys]
+        hits = sum(vector is not None for vector in vectors)
+        self.hits += hits
+        self.misses += len(vectors) - hits
+        return vectors
+
+    def put_many(self, model_name: str, normalize: bool,
+                 texts: List[str], vectors: List[List[float]]):
+        """Store freshly computed vectors and evict old entries if over budget."""
+        now = time.time()
+        blobs = {
+            self.make_key(model_name, normalize, text): array('f', vector).tobytes()
+            for text, vector in zip(texts, vectors)
+        }
+        with self._lock:
+            replaced = self._stored_lengths(list(blobs))
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, vector, last_used) VALUES (?, ?, ?)",
+                [(key, blob, now) for key, blob in blobs.items()]
+            )
+            self._conn.commit()
+            self._entries += len(blobs) - len(replaced)
+            self._bytes += sum(len(blob) for blob in blobs.values()) - sum(replaced.values())
+            self._evict()
+
+    def stats(self) -> Dict:
+        """Hit/miss counters and the current cache size."""
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": self._entries,
+            "bytes": self._bytes
+        }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def _measure(self):
+        return self._conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(LENGTH(vector)), 0) FROM embeddings"
+        ).fetchone()
+
+    def _stored_lengths(self, keys: List[str]) -> Dict[str, int]:
+        lengths: Dict[str, int] = {}
+        for start in range(0, len(keys), 500):
+            batch = keys[start:start + 500]
+            placeholders = ",".join("?" * len(batch))
+            lengths.update(self._conn.execute(
+                f"SELECT key, LENGTH(vector) FROM embeddings WHERE key IN ({placeholders})",
+                batch
+            ).fetchall())
+        return lengths
+
+    def _evict(self):
+        if self._bytes <= self.max_bytes:
+            return
+        # Other processes may share the file, so re-sync the counters before deleting anything
+        self._entries, self._bytes = self._measure()
+        size = self._bytes
+        if size <= self.max_bytes:
+            return
+
+        # Drop least recently used entries until back under 90% of the budget
+        target = int(self.max_bytes * 0.9)
+        freed = 0
+        stale_keys = []
+        for key, length in self._conn.execute(
+                "SELECT key, LENGTH(vector) FROM embeddings ORDER BY last_used"):
+            if size - freed <= target:
+                break
+            stale_keys.append((key,))
+            freed += length
+        self._conn.executemany("DELETE FROM embeddings WHERE key = ?", stale_keys)
+        self._conn.commit()
+        self._entries -= len(stale_keys)
+        self._bytes -= freed
@@ -0,0 +1,117 @@
+"""Recall and memory of int8/binary embedding storage against float32.
+
+Embeds the bundled evaluation set with the pipeline's embedding model, then
+searches it exhaustively with each storage type so only quantization differs.
+Distractor vectors from an existing collection make the task realistically hard.
+
+Examples:
+    python eval_quantization.py
+    python eval_quantization.py --distractors-collection company_docs -k 5
+"""
+import argparse
+import json
+import sys
+import tempfile
+from pathlib import Path
+from typing import Dict, List, Optional
+import numpy as np
+from langchain_core.documents import Document
+from local_vector_store import LocalVectorStore
+from model_registry import DEFAULT_EMBEDDING_MODEL, get_embeddings
+
+DEFAULT_EVAL_SET = Path(__file__).parent / "eval" / "quantization_eval.jsonl"
+CONFIGS = [
+    ("float32", False),
+    ("int8", False),
+    ("int8", True),
+    ("binary", False),
+    ("binary", True)
+]
+
+
+def load_eval_set(path: Path):
+    passages, queries = [], []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                record = json.loads(line)
+                (passages if record["type"] == "passage" else queries).append(record)
+    return passages, queries
+
+
+def evaluate(ids: List[str], vectors: np.ndarray, query_vectors: np.ndarray,
+             relevant: List[set], k: int, dtype: str, rescore: bool,
+             rescore_factor: Optional[int], workdir: Path) -> Dict:
+    store = LocalVectorStore(
+        str(workdir / f"{dtype}_{rescore}"), index="flat", dtype=dtype,
+        rescore=rescore, rescore_factor=rescore_factor
+    )
+    for start in range(0, len(ids), 1000):
+        batch = ids[start:start + 1000]
+        store.upsert(batch, vectors[start:start + 1000], [Document(page_content="") for _ in batch])
+
+    results = []
+    for query in query_vectors:
+        results.append([ids[ordinal] for ordinal, _ in store.search_ordinals(query, k)])
+    recall = float(np.mean([
+        len(expected & set(found)) / min(len(expected), k) for expected, found in zip(relevant, results)
+    ]))
+    report = {
+        "results": results,
+        "recall": recall,
+        "bytes_per_vector": store.memory_bytes() / len(ids),
+        "rescore_bytes_per_vector": store.rescore_bytes() / len(ids)
+    }
+    store.drop()
+    return report
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Measure the recall cost of quantized embeddings.")
+    parser.add_argument("--eval-set", type=Path, default=DEFAULT_EVAL_SET)
+    parser.add_argument("-k", type=int, default=3)
+    parser.add_argument("--distractors-collection", default=None,
+                        help="add every vector of this Chroma collection as a distractor")
+    parser.add_argument("--persist-directory", default="./chroma_db")
+    parser.add_argument("--rescore-factor", type=int, default=None,
+                        help="candidates per result rescored in float32 (default: 4 for int8, 10 for binary)")
+    args = parser.parse_args(argv)
+
+    passages, queries = load_eval_set(args.eval_set)
+    embeddings = get_embeddings(DEFAULT_EMBEDDING_MODEL)
+    ids = [passage["id"] for passage in passages]
+    vectors = np.asarray(embeddings.embed_documents([p["text"] for p in passages]), dtype=np.float32)
+    query_vectors = np.asarray([embeddings.embed_query(q["text"]) for q in queries], dtype=np.float32)
+    relevant = [set(query["relevant"]) for query in queries]
+
+    if args.distractors_collection:
+        from benchmark_ann import collection_vectors
+        distractors = collection_vectors(args.distractors_collection, args.persist_directory)
+        ids += [f"distractor-{i}" for i in range(len(distractors))]
+        vectors = np.concatenate([vectors, distractors])
+
+    print(f"{len(queries)} queries over {len(ids)} vectors of dim {vectors.shape[1]}, k={args.k}\n")
+    print(f"{'storage':<16} {'recall@k':>9} {'agree@k':>8} {'B/vector':>9} {'saving':>7} {'rescore B':>10}")
+    with tempfile.TemporaryDirectory() as workdir:
+        reference = None
+        for dtype, rescore in CONFIGS:
+            report = evaluate(
+                ids, vectors, query_vectors, relevant, args.k, dtype, rescore,
+                args.rescore_factor, Path(workdir)
+            )
+            if reference is None:
+                reference = report
+            # Agreement: share of the float32 top-k that quantized search also returns
+            agreement = float(np.mean([
+                len(set(found) & set(expected)) / max(len(expected), 1)
+                for found, expected in zip(report["results"], reference["results"])
+            ]))
+            name = dtype + (" + rescore" if rescore else "")
+            saving = reference["bytes_per_vector"] / report["bytes_per_vector"]
+            print(f"{name:<16} {report['recall']:>9.3f} {agreement:>8.3f} {report['bytes_per_vector']:>9.0f} "
+                  f"{saving:>6.1f}x {report['rescore_bytes_per_vector']:>10.0f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
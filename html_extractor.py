@@ -0,0 +1,146 @@
+import re
+from html.parser import HTMLParser
+from typing import Dict, List, Optional, Tuple
+
+# Page chrome that never carries content worth embedding
+SKIP_TAGS = {
+    "script", "style", "noscript", "template", "svg", "canvas",
+    "iframe", "nav", "aside", "form", "button", "select"
+}
+# Site-wide banners; kept when they sit inside the main content (e.g. an article header)
+CHROME_TAGS = {"header", "footer"}
+MAIN_TAGS = {"main", "article"}
+HEADING_TAGS = {"h1", "h2", "h3", "h4", "h5", "h6"}
+BLOCK_TAGS = {
+    "p", "div", "section", "li", "ul", "ol", "tr", "table", "pre",
+    "blockquote", "dd", "dt", "figcaption", "br", "hr"
+}
+VOID_TAGS = {"br", "hr", "img", "input", "meta", "link", "source", "wbr"}
+
+
+class _SectionParser(HTMLParser):
+    """Collects visible text grouped under the nearest preceding heading."""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.skip_stack: List[str] = []
+        self.main_depth = 0
+        self.headings: Dict[int, str] = {}
+        self.heading_level: Optional[int] = None
+        self.heading_text: List[str] = []
+        # Each section: [heading path, paragraphs, inside main content]
+        self.sections: List[list] = [["", [], False]]
+        self.paragraph: List[str] = []
+        self.title: List[str] = []
+        self.in_title = False
+
+    def handle_starttag(self, tag, attrs):
+        if tag in VOID_TAGS:
+            if tag in BLOCK_TAGS:
+                self._end_paragraph()
+            return
+        if tag == "title":
+            self.in_title = True
+        if self.skip_stack:
+            # Only the skipped tag's own nesting matters; unclosed <p>s inside must not leak
+            if tag == self.skip_stack[-1]:
+                self.skip_stack.append(tag)
+            return
+        if tag in SKIP_TAGS or (tag in CHROME_TAGS and self.main_depth == 0):
+            self.skip_stack.append(tag)
+            return
+        if tag in MAIN_TAGS or dict(attrs).get("role") == "main":
+            self._end_paragraph()
+            self.main_depth += 1
+        if tag in HEADING_TAGS:
+            self._end_paragraph()
+            self.heading_level = int(tag[1])
+            self.heading_text = []
+        elif tag in BLOCK_TAGS:
+            self._end_paragraph()
+
+    def handle_endtag(self, tag):
+        if tag == "title":
+            self.in_title = False
+        if tag in VOID_TAGS:
+            return
+        if self.skip_stack:
+            if tag == self.skip_stack[-1]:
+                self.skip_stack.pop()
+            return
+        if tag in HEADING_TAGS and self.heading_level is not None:
+            text = _normalize("".join(self.heading_text))
+            level = self.heading_level
+            self.heading_level = None
+            if text:
+                self.headings = {k: v for k, v in self.headings.items() if k < level}
+                self.headings[level] = text
+                path = " > ".join(self.headings[k] for k in sorted(self.headings))
+                self.sections.append([path, [], self.main_depth > 0])
+        elif tag in BLOCK_TAGS:
+            self._end_paragraph()
+        if tag in MAIN_TAGS and self.main_depth:
+            self._end_paragraph()
+            self.main_depth -= 1
+
+    def handle_data(self, data):
+        if self.in_title:
+            self.title.append(data)
+            return
+        if self.skip_stack:
+            return
+        if self.heading_level is not None:
+            self.heading_text.append(data)
+        else:
+            self.paragraph.append(data)
+
+    def _end_paragraph(self):
+        text = _normalize("".join(self.paragraph))
+        self.paragraph = []
+        if not text:
+            return
+        section = self.sections[-1]
+        if section[1] and section[2] != (self.main_depth > 0):
+            # Text moved in or out of main content under the same heading
+            section = [section[0], [], self.main_depth > 0]
+            self.sections.append(section)
+        elif not section[1]:
+            section[2] = self.main_depth > 0
+        section[1].append(text)
+
+    def close(self):
+        super().close()
+        self._end_paragraph()
+
+
+def _normalize(text: str) -> str:
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def extract_sections(html: str) -> List[Tuple[str, str]]:
+    """Return (heading path, text) pairs for the page's main content.
+
+    Scripts, styles, navigation and page headers/footers are dropped. When the
+    page marks up a <main>/<article> region only that region is kept.
+    """
+    parser = _SectionParser()
+    parser.feed(html)
+    parser.close()
+
+    sections = [section for section in parser.sections if section[1]]
+    if any(in_main for _, _, in_main in sections):
+        sections = [section for section in sections if section[2]]
+
+    title = _normalize("".join(parser.title))
+    return [
+        (path or title, "\n\n".join(paragraphs))
+        for path, paragraphs, _ in sections
+    ]
+
+
+def looks_like_html(content_type: str, text: str) -> bool:
+    """Whether a response should go through the HTML extractor."""
+    if "html" in content_type:
+        return True
+    head = text[:512].lstrip().lower()
+    return head.startswith("<!doctype html") or head.startswith("<html")
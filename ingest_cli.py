@@ -0,0 +1,296 @@
+"""Headless bulk ingestion of a directory or archive into a Chroma collection.
+
+Example:
+    python ingest_cli.py ./docs --collection company_docs --workers 8
+"""
+import argparse
+import hashlib
+import json
+import os
+import sys
+import tarfile
+import time
+import zipfile
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from itertools import islice
+from pathlib import Path
+from typing import Dict, List, Optional, Set, Tuple
+from langchain_core.documents import Document
+
+ARCHIVE_SUFFIXES = ('.zip', '.tar', '.tar.gz', '.tgz', '.tar.bz2', '.tar.xz')
+
+_worker_preprocessor = None
+
+
+def _parse_file(task: Tuple[str, Optional[int], int]) -> Tuple[str, Optional[List[Document]], List[int], Optional[str]]:
+    """Process-pool worker: turn one file into Documents and their token lengths."""
+    global _worker_preprocessor
+    path, chunk_tokens, chunk_overlap_tokens = task
+    try:
+        if _worker_preprocessor is None:
+            from preprocessor import FilePreprocessor
+            # Parsing already runs one file per core, so OCR stays single-process here
+            _worker_preprocessor = FilePreprocessor(
+                ocr_workers=1, chunk_tokens=chunk_tokens, chunk_overlap_tokens=chunk_overlap_tokens
+            )
+        stats = _worker_preprocessor.new_chunk_stats()
+        documents = _worker_preprocessor.process_file(path, stats=stats)
+        return path, documents, stats.lengths if stats else [], None
+    except Exception as e:
+        return path, None, [], f"{type(e).__name__}: {e}"
+
+
+def _is_archive(path: Path) -> bool:
+    return path.is_file() and path.name.lower().endswith(ARCHIVE_SUFFIXES)
+
+
+def _extract_archive(archive: Path, staging_root: Path) -> Path:
+    """Unpack an archive into a directory keyed by its content so resumes see the same paths."""
+    digest = hashlib.sha256()
+    with open(archive, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    target = staging_root / digest.hexdigest()[:16]
+    marker = target / ".extracted"
+    if marker.exists():
+        return target
+
+    target.mkdir(parents=True, exist_ok=True)
+    resolved_target = target.resolve()
+    if archive.name.lower().endswith('.zip'):
+        with zipfile.ZipFile(archive) as zf:
+            for member in zf.namelist():
+                destination = (target / member).resolve()
+                if resolved_target not in destination.parents and destination != resolved_target:
+                    raise ValueError(f"Unsafe path in archive: {member}")
+            zf.extractall(target)
+    else:
+        with tarfile.open(archive) as tf:
+            for member in tf.getmembers():
+                destination = (target / member.name).resolve()
+                if resolved_target not in destination.parents and destination != resolved_target:
+                    raise ValueError(f"Unsafe path in archive: {member.name}")
+                if member.issym() or member.islnk():
+                    raise ValueError(f"Links are not allowed in archives: {member.name}")
+            tf.extractall(target)
+    marker.touch()
+    return target
+
+
+def _collect_files(root: Path, extensions) -> List[Path]:
+    if root.is_file():
+        return [root]
+    return sorted(
+        path for path in root.rglob("*")
+        if path.is_file() and path.suffix.lower() in extensions
+    )
+
+
+def _fingerprint(path: Path) -> str:
+    stat = path.stat()
+    return f"{stat.st_size}:{stat.st_mtime_ns}"
+
+
+class Checkpoint:
+    """Records finished files so an interrupted run can resume where it stopped."""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.completed: Dict[str, str] = {}
+        if path.exists():
+            with open(path, 'r', encoding='utf-8') as f:
+                self.completed = json.load(f).get("completed", {})
+
+    def is_done(self, file_path: Path) -> bool:
+        return self.completed.get(str(file_path)) == _fingerprint(file_path)
+
+    def mark_done(self, file_paths: List[str]):
+        for file_path in file_paths:
+            self.completed[file_path] = _fingerprint(Path(file_path))
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix(".tmp")
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({"completed": self.completed}, f)
+        os.replace(tmp_path, self.path)
+
+
+def ingest(source: Path,
+           collection_name: str,
+           persist_directory: str = "./chroma_db",
+           workers: Optional[int] = None,
+           batch_size: int = 256,
+           chunk_tokens: Optional[int] = None,
+           chunk_overlap_tokens: int = 16,
+           checkpoint_path: Optional[Path] = None) -> Dict:
+    """Parse files in a process pool and feed their chunks to a single embedding stage."""
+    from chunker import ChunkStats
+    from model_registry import get_tokenizer
+    from preprocessor import FilePreprocessor
+    from rag_pipeline import RAGPipeline
+
+    if _is_archive(source):
+        source = _extract_archive(source, Path(persist_directory) / "ingest_staging")
+    extensions = FilePreprocessor.SUPPORTED_EXTENSIONS
+    files = _collect_files(source, extensions)
+
+    checkpoint = Checkpoint(
+        checkpoint_path or Path(persist_directory) / f"ingest_checkpoint_{collection_name}.json"
+    )
+    pending = [path for path in files if not checkpoint.is_done(path)]
+    skipped = len(files) - len(pending)
+    print(f"Found {len(files)} files, {skipped} already ingested, {len(pending)} to go", flush=True)
+
+    # Ingestion never queries, so skip building the in-memory keyword index
+    pipeline = RAGPipeline(
+        collection_name, persist_directory=persist_directory, batch_size=batch_size, retrieval_mode="dense"
+    )
+    pipeline.load_persisted()
+
+    started = time.perf_counter()
+    failures: Dict[str, str] = {}
+    chunk_stats = ChunkStats(get_tokenizer(pipeline.EMBEDDING_MODEL)[1])
+    totals = {"added": 0, "deleted": 0, "unchanged": 0}
+    chunks = 0
+    done = 0
+    unsaved_chunks = 0
+    written_files: List[str] = []
+    # New chunks are buffered across files so every embedding batch is full
+    buffered: List[Document] = []
+    waiting: List[Tuple[str, Set[str], Dict[str, Dict], int, int]] = []
+
+    def finish(path: str, stale: Set[str], kept: Dict[str, Dict], chunk_count: int):
+        nonlocal unsaved_chunks
+        # A modified file replaces its previous chunks instead of adding to them
+        pipeline.finish_source(path, stale, kept)
+        totals["deleted"] += len(stale)
+        written_files.append(path)
+        unsaved_chunks += chunk_count
+
+    def write_buffered(final: bool = False):
+        # Only whole batches are written until the last files have been parsed
+        count = len(buffered) if final else len(buffered) - len(buffered) % batch_size
+        totals["added"] += len(pipeline.add_documents(buffered[:count], batch_size))
+        del buffered[:count]
+        # Stale chunks are only dropped once all of a file's replacements are stored
+        remaining = []
+        for path, stale, kept, chunk_count, end in waiting:
+            if end <= count:
+                finish(path, stale, kept, chunk_count)
+            else:
+                remaining.append((path, stale, kept, chunk_count, end - count))
+        waiting[:] = remaining
+
+    def flush():
+        nonlocal unsaved_chunks
+        # Files are only marked done once their chunks are in the store
+        checkpoint.mark_done(written_files)
+        written_files.clear()
+        unsaved_chunks = 0
+
+    def consume(result):
+        nonlocal chunks, done
+        path, documents, lengths, error = result
+        done += 1
+        if error is not None:
+            failures[path] = error
+        else:
+            chunk_stats.lengths.extend(lengths)
+            new_documents, stale, kept = pipeline.diff_source(path, documents)
+            totals["unchanged"] += len(kept)
+            chunks += len(new_documents) + len(kept)
+            if new_documents:
+                buffered.extend(new_documents)
+                waiting.append((path, stale, kept, len(documents), len(buffered)))
+            else:
+                finish(path, stale, kept, len(documents))
+            if len(buffered) >= batch_size:
+                write_buffered()
+            if unsaved_chunks >= batch_size:
+                flush()
+        if done % 50 == 0 or done == len(pending):
+            elapsed = time.perf_counter() - started
+            print(f"  {done}/{len(pending)} files parsed, {chunks} chunks indexed "
+                  f"({done / elapsed:.1f} files/s)", flush=True)
+
+    tasks = ((str(path), chunk_tokens, chunk_overlap_tokens) for path in pending)
+    workers = workers or os.cpu_count() or 1
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        # A bounded window keeps at most a few parsed files in memory at a time
+        in_flight = {pool.submit(_parse_file, task) for task in islice(tasks, 2 * workers)}
+        while in_flight:
+            finished, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+            for task in islice(tasks, len(finished)):
+                in_flight.add(pool.submit(_parse_file, task))
+            for future in finished:
+                consume(future.result())
+        if waiting:
+            write_buffered(final=True)
+        flush()
+
+    elapsed = time.perf_counter() - started
+    return {
+        "files": len(files),
+        "ingested": len(pending) - len(failures),
+        "skipped": skipped,
+        "failed": failures,
+        "chunks": chunks,
+        **totals,
+        "seconds": elapsed,
+        "files_per_sec": (len(pending) - len(failures)) / elapsed if elapsed > 0 else 0.0,
+        "chunks_per_sec": chunks / elapsed if elapsed > 0 else 0.0,
+        "chunk_stats": chunk_stats.summary()
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        description="Bulk-ingest a directory or zip/tar archive into a Chroma collection."
+    )
+    parser.add_argument("source", type=Path, help="directory, single file or archive to ingest")
+    parser.add_argument("--collection", default="bulk_ingest",
+                        help="Chroma collection to write into (default: bulk_ingest)")
+    parser.add_argument("--persist-directory", default="./chroma_db")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="parser processes (default: one per core)")
+    parser.add_argument("--batch-size", type=int, default=256,
+                        help="chunks embedded and written per batch")
+    parser.add_argument("--chunk-tokens", type=int, default=None,
+                        help="chunk length in embedding-model tokens (default: the model's limit)")
+    parser.add_argument("--chunk-overlap-tokens", type=int, default=16)
+    parser.add_argument("--checkpoint", type=Path, default=None,
+                        help="progress file used to resume interrupted runs")
+    args = parser.parse_args(argv)
+
+    if not args.source.exists():
+        parser.error(f"{args.source} does not exist")
+
+    report = ingest(
+        args.source,
+        args.collection,
+        persist_directory=args.persist_directory,
+        workers=args.workers,
+        batch_size=args.batch_size,
+        chunk_tokens=args.chunk_tokens,
+        chunk_overlap_tokens=args.chunk_overlap_tokens,
+        checkpoint_path=args.checkpoint
+    )
+
+    print(f"\nIngested {report['ingested']} of {report['files']} files "
+          f"({report['skipped']} skipped from checkpoint) in {report['seconds']:.1f}s")
+    print(f"{report['chunks']} chunks, {report['files_per_sec']:.2f} files/s, "
+          f"{report['chunks_per_sec']:.1f} chunks/s")
+    print(f"Added {report['added']}, removed {report['deleted']}, kept {report['unchanged']} chunks")
+    lengths = report["chunk_stats"]
+    if lengths["chunks"]:
+        print(f"Chunk length {lengths['min_tokens']}-{lengths['max_tokens']} tokens "
+              f"(mean {lengths['mean_tokens']:.0f}), {lengths['truncated']} truncated "
+              f"({lengths['truncation_rate']:.1%})")
+    if report["failed"]:
+        print(f"{len(report['failed'])} failures:")
+        for path, error in report["failed"].items():
+            print(f"  {path}: {error}")
+    return 1 if report["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
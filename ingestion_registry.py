@@ -0,0 +1,65 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Optional
+
+
+class IngestionRegistry:
+    """Content-addressed record of uploads that are already indexed."""
+
+    def __init__(self, persist_directory: str = "./chroma_db",
+                 filename: str = "ingestion_registry.json"):
+        # Stored inside the Chroma directory so wiping the index wipes the registry
+        self.path = Path(persist_directory) / filename
+        self._lock = threading.Lock()
+        self._entries = self._load()
+
+    @staticmethod
+    def make_key(content: bytes,
+                 chunk_tokens: Optional[int],
+                 chunk_overlap_tokens: int,
+                 embedding_model: str,
+                 collection_name: str) -> str:
+        """Build a cache key from file bytes and the ingestion settings."""
+        content_hash = hashlib.sha256(content).hexdigest()
+        settings = f"{chunk_tokens}:{chunk_overlap_tokens}:{embedding_model}:{collection_name}"
+        return f"{content_hash}:{hashlib.sha256(settings.encode()).hexdigest()[:16]}"
+
+    def lookup(self, key: str) -> Optional[Dict]:
+        """Return the stored entry for a key, or None on a cache miss."""
+        with self._lock:
+            return self._entries.get(key)
+
+    def record(self, key: str, info: Dict):
+        """Mark content as indexed and persist the registry to disk."""
+        with self._lock:
+            self._entries[key] = {**info, "indexed_at": time.time()}
+            self._save()
+
+    def forget_collection(self, collection_name: str):
+        """Drop every entry that was indexed into an evicted collection."""
+        with self._lock:
+            self._entries = {
+                key: entry for key, entry in self._entries.items()
+                if entry.get("collection") != collection_name
+            }
+            self._save()
+
+    def _load(self) -> Dict:
+        if not self.path.exists():
+            return {}
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return {}
+
+    def _save(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix(".tmp")
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self._entries, f)
+        os.replace(tmp_path, self.path)
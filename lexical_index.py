@@ -0,0 +1,157 @@
+import math
+import re
+import threading
+from array import array
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+import numpy as np
+
+# Keeps identifiers like "INV-2024/0815", "order_id" or "3.5.1" together as one term
+TOKEN_PATTERN = re.compile(r"\w+(?:[-./:#]\w+)*")
+PART_SEPARATORS = re.compile(r"[-./:#_]+")
+MAX_TF = 65535
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercased terms; compound identifiers also yield their parts."""
+    terms = []
+    for match in TOKEN_PATTERN.finditer(text.lower()):
+        term = match.group()
+        terms.append(term)
+        parts = PART_SEPARATORS.split(term)
+        if len(parts) > 1:
+            terms.extend(part for part in parts if part)
+    return terms
+
+
+def reciprocal_rank_fusion(rankings: Sequence[Sequence[str]], k: int = 60) -> List[Tuple[str, float]]:
+    """Merge ranked ID lists by summing 1 / (k + rank) over the lists each ID appears in."""
+    scores: Dict[str, float] = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking, start=1):
+            scores[doc_id] = scores.get(doc_id, 0.0) + 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
+
+
+class BM25Index:
+    """In-memory BM25 inverted index that is updated incrementally.
+
+    Postings are flat arrays per term, scored with numpy, so a query only touches
+    the postings of its own terms. Deleted chunks are tombstoned and the postings
+    compacted once too many of them pile up.
+    """
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75, compact_ratio: float = 0.25):
+        self.k1 = k1
+        self.b = b
+        self.compact_ratio = compact_ratio
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        # term -> (chunk ordinals, term frequencies)
+        self._postings: Dict[str, Tuple[array, array]] = {}
+        self._doc_ids: List[Optional[str]] = []
+        self._ordinals: Dict[str, int] = {}
+        self._lengths = array('f')
+        self._alive = bytearray()
+        self._total_length = 0.0
+        self._dead = 0
+
+    def __len__(self) -> int:
+        return len(self._ordinals)
+
+    def add(self, ids: Iterable[str], texts: Iterable[str]):
+        """Index chunks; IDs already present are skipped since IDs are content-addressed."""
+        with self._lock:
+            for doc_id, text in zip(ids, texts):
+                if doc_id not in self._ordinals:
+                    self._add(doc_id, tokenize(text))
+
+    def _add(self, doc_id: str, terms: List[str]):
+        ordinal = len(self._doc_ids)
+        self._doc_ids.append(doc_id)
+        self._ordinals[doc_id] = ordinal
+        self._lengths.append(len(terms))
+        self._alive.append(1)
+        self._total_length += len(terms)
+        for term, tf in Counter(terms).items():
+            postings = self._postings.get(term)
+            if postings is None:
+                postings = self._postings[term] = (array('i'), array('H'))
+            postings[0].append(ordinal)
+            postings[1].append(min(tf, MAX_TF))
+
+    def remove(self, ids: Iterable[str]):
+        with self._lock:
+            for doc_id in ids:
+                ordinal = self._ordinals.pop(doc_id, None)
+                if ordinal is None:
+                    continue
+                self._doc_ids[ordinal] = None
+                self._alive[ordinal] = 0
+                self._total_length -= self._lengths[ordinal]
+                self._dead += 1
+            if self._dead > self.compact_ratio * max(len(self._doc_ids), 1):
+                self._compact()
+
+    def _compact(self):
+        """Rebuild the postings without tombstoned chunks."""
+        remap = array('i', [-1]) * len(self._doc_ids)
+        doc_ids, lengths = [], array('f')
+        for ordinal, doc_id in enumerate(self._doc_ids):
+            if doc_id is not None:
+                remap[ordinal] = len(doc_ids)
+                doc_ids.append(doc_id)
+                lengths.append(self._lengths[ordinal])
+
+        postings = {}
+        for term, (ordinals, tfs) in self._postings.items():
+            kept_ordinals, kept_tfs = array('i'), array('H')
+            for ordinal, tf in zip(ordinals, tfs):
+                if remap[ordinal] >= 0:
+                    kept_ordinals.append(remap[ordinal])
+                    kept_tfs.append(tf)
+            if kept_ordinals:
+                postings[term] = (kept_ordinals, kept_tfs)
+
+        self._postings = postings
+        self._doc_ids = doc_ids
+        self._ordinals = {doc_id: ordinal for ordinal, doc_id in enumerate(doc_ids)}
+        self._lengths = lengths
+        self._alive = bytearray([1]) * len(doc_ids)
+        self._dead = 0
+
+    def search(self, query: str, k: int = 10) -> List[Tuple[str, float]]:
+        """Top-k (chunk ID, BM25 score) pairs for a query."""
+        terms = set(tokenize(query))
+        with self._lock:
+            if not self._ordinals or not terms:
+                return []
+            # The numpy views must be gone before writers may resize the arrays again
+            return self._search(terms, k)
+
+    def _search(self, terms: set, k: int) -> List[Tuple[str, float]]:
+        live = len(self._ordinals)
+        lengths = np.frombuffer(self._lengths, dtype=np.float32)
+        avg_length = max(self._total_length / live, 1.0)
+        scores = np.zeros(len(self._doc_ids), dtype=np.float32)
+        for term in terms:
+            postings = self._postings.get(term)
+            if postings is None:
+                continue
+            ordinals = np.frombuffer(postings[0], dtype=np.int32)
+            tfs = np.frombuffer(postings[1], dtype=np.uint16).astype(np.float32)
+            df = len(ordinals)
+            idf = math.log(1.0 + max(live - df + 0.5, 0.5) / (df + 0.5))
+            norm = self.k1 * (1.0 - self.b + self.b * lengths[ordinals] / avg_length)
+            # Each chunk appears once per term, so fancy-index += is safe
+            scores[ordinals] += idf * tfs * (self.k1 + 1.0) / (tfs + norm)
+        if self._dead:
+            scores *= np.frombuffer(self._alive, dtype=np.uint8)
+
+        hits = np.flatnonzero(scores)
+        if len(hits) > k:
+            hits = hits[np.argpartition(scores[hits], -k)[-k:]]
+        hits = hits[np.argsort(scores[hits])[::-1]]
+        return [(self._doc_ids[i], float(scores[i])) for i in hits]
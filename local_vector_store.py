@@ -0,0 +1,747 @@
+import heapq
+import json
+import math
+import os
+import random
+import shutil
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+import numpy as np
+from langchain_core.documents import Document
+from vector_store import VectorStore
+
+INDEX_TYPES = ("flat", "ivf", "hnsw")
+# "binary" keeps one sign bit per dimension, packed eight to a byte
+STORAGE_DTYPES = {"float32": np.float32, "float16": np.float16, "int8": np.int8, "binary": np.uint8}
+QUANTIZED_DTYPES = ("int8", "binary")
+# Row v holds the eight bits of byte value v, most significant first like np.packbits
+BYTE_BITS = np.unpackbits(np.arange(256, dtype=np.uint8)[:, None], axis=1).astype(np.float32)
+# Below this many vectors IVF searches exhaustively; clustering would not pay off yet
+IVF_MIN_TRAIN_SIZE = 10_000
+
+
+class _MappedArray:
+    """A 2-D array in a file, memory-mapped and grown by doubling its capacity."""
+
+    def __init__(self, path: Path, dtype, width: int, fill: int = 0):
+        self.path = path
+        self.dtype = np.dtype(dtype)
+        self.width = width
+        self.fill = fill
+        row_bytes = self.dtype.itemsize * width
+        capacity = path.stat().st_size // row_bytes if path.exists() else 0
+        self._map(capacity)
+
+    def _map(self, capacity: int):
+        if capacity == 0:
+            self.mapped = None
+            self.array = np.zeros((0, self.width), dtype=self.dtype)
+        else:
+            self.mapped = np.memmap(self.path, dtype=self.dtype, mode="r+", shape=(capacity, self.width))
+            # A plain ndarray view of the same pages; indexing np.memmap itself is several times slower
+            self.array = self.mapped.view(np.ndarray)
+
+    def reserve(self, rows: int):
+        capacity = len(self.array)
+        if rows <= capacity:
+            return
+        new_capacity = max(1024, 2 * capacity, rows)
+        self.flush()
+        # The mapping must be released before the file can grow on every platform
+        self.mapped = self.array = None
+        with open(self.path, "ab") as f:
+            f.truncate(new_capacity * self.dtype.itemsize * self.width)
+        self._map(new_capacity)
+        if self.fill:
+            self.array[capacity:] = self.fill
+
+    def shrink(self, rows: int):
+        """Cut the file down to its first rows, e.g. after compaction."""
+        if rows >= len(self.array):
+            return
+        self.flush()
+        self.mapped = self.array = None
+        with open(self.path, "r+b") as f:
+            f.truncate(rows * self.dtype.itemsize * self.width)
+        self._map(rows)
+
+    def flush(self):
+        if self.mapped is not None:
+            self.mapped.flush()
+
+
+class LocalVectorStore(VectorStore):
+    """In-process vector index whose vectors and graph live in memory-mapped files.
+
+    Vectors are stored as float32, float16, int8 (with one scale per vector) or
+    binary sign bits and searched exhaustively ("flat"), through k-means inverted
+    lists ("ivf", tuned by nprobe) or through an HNSW graph ("hnsw", tuned by
+    ef_search). With rescore, a float32 copy is kept in a separate file that is
+    only read for the rescore_factor * k candidates the quantized search returns.
+    Structural settings are fixed when the collection is created and reopening it
+    with different ones raises ValueError; search settings can change on every
+    open. Deleted chunks are tombstoned and skipped at search time; once they make
+    up compact_ratio of the stored vectors, the files are compacted without them.
+    """
+
+    def __init__(self, directory: str,
+                 index: Optional[str] = None,
+                 dtype: Optional[str] = None,
+                 m: Optional[int] = None,
+                 ef_construction: int = 100,
+                 ef_search: int = 64,
+                 nlist: Optional[int] = None,
+                 nprobe: int = 8,
+                 rescore: Optional[bool] = None,
+                 rescore_factor: Optional[int] = None,
+                 compact_ratio: float = 0.25,
+                 seed: int = 0):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.meta_path = self.directory / "meta.json"
+        meta = {}
+        if self.meta_path.exists():
+            with open(self.meta_path, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+
+        # An existing collection keeps the layout it was built with; asking for another is an error
+        requested = {"index": index, "dtype": dtype, "m": m, "nlist": nlist, "rescore": rescore}
+        for key, value in requested.items():
+            stored = meta.get(key)
+            if value is not None and stored is not None and value != stored:
+                raise ValueError(
+                    f"{self.directory} was built with {key}={stored!r}, not {value!r}; "
+                    f"use a new collection to change it"
+                )
+        self.index = meta.get("index", index or "hnsw")
+        self.dtype = meta.get("dtype", dtype or "float32")
+        self.m = meta.get("m", m or 16)
+        # IVF picks nlist when it is first trained
+        self.nlist = meta.get("nlist") or nlist
+        if rescore is None:
+            rescore = self.dtype in QUANTIZED_DTYPES
+        self.rescore = meta.get("rescore", rescore)
+        if self.index not in INDEX_TYPES:
+            raise ValueError(f"Unsupported index type: {self.index}")
+        if self.dtype not in STORAGE_DTYPES:
+            raise ValueError(f"Unsupported storage dtype: {self.dtype}")
+        self.ef_construction = ef_construction
+        self.ef_search = ef_search
+        self.nprobe = nprobe
+        # Sign bits lose more ordering than int8, so binary rescoring looks further down
+        self.rescore_factor = rescore_factor or (10 if self.dtype == "binary" else 4)
+        self.compact_ratio = compact_ratio
+
+        self.dim: Optional[int] = meta.get("dim")
+        self.size: int = meta.get("size", 0)
+        self.entry_point: Optional[int] = meta.get("entry_point")
+        self.max_level: int = meta.get("max_level", 0)
+        self.trained_size: int = meta.get("trained_size", 0)
+        self._random = random.Random(seed + self.size)
+        self._level_mult = 1.0 / math.log(max(self.m, 2))
+        self._lock = threading.RLock()
+
+        self._conn = sqlite3.connect(self.directory / "docs.sqlite", timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS chunks ("
+            "ordinal INTEGER PRIMARY KEY, id TEXT NOT NULL UNIQUE, text TEXT, metadata TEXT)"
+        )
+        self._conn.commit()
+
+        self.upper: Dict[int, List[List[int]]] = {}
+        upper_path = self.directory / "upper.json"
+        if upper_path.exists():
+            with open(upper_path, 'r', encoding='utf-8') as f:
+                self.upper = {int(node): layers for node, layers in json.load(f).items()}
+        # Upserts append only the upper-layer nodes they changed; see _save_upper
+        self._dirty_upper = set()
+        self._upper_logged = 0
+        log_path = self.directory / "upper.log"
+        if log_path.exists():
+            with open(log_path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        changed = json.loads(line)
+                    except json.JSONDecodeError:
+                        # A torn final append from an interrupted write
+                        break
+                    self.upper.update((int(node), layers) for node, layers in changed.items())
+                    self._upper_logged += len(changed)
+        self.centroids: Optional[np.ndarray] = None
+        if (self.directory / "centroids.npy").exists():
+            self.centroids = np.load(self.directory / "centroids.npy")
+        self._arrays: Dict[str, _MappedArray] = {}
+        self._dead = 0
+        if self.dim is not None:
+            self._open_arrays()
+            self._dead = int(self._arrays["deleted"].array[:self.size].sum())
+
+    @classmethod
+    def open(cls, collection_name: str, persist_directory: str, **options) -> "LocalVectorStore":
+        return cls(os.path.join(persist_directory, "local_index", collection_name), **options)
+
+    def _open_arrays(self):
+        width = (self.dim + 7) // 8 if self.dtype == "binary" else self.dim
+        self._arrays["vectors"] = _MappedArray(
+            self.directory / "vectors.bin", STORAGE_DTYPES[self.dtype], width
+        )
+        if self.rescore:
+            self._arrays["full"] = _MappedArray(self.directory / "full.bin", np.float32, self.dim)
+        self._arrays["deleted"] = _MappedArray(self.directory / "deleted.bin", np.uint8, 1)
+        if self.dtype == "int8":
+            self._arrays["scales"] = _MappedArray(self.directory / "scales.bin", np.float32, 1)
+        if self.index == "hnsw":
+            self._arrays["graph"] = _MappedArray(self.directory / "graph0.bin", np.int32, 2 * self.m, fill=-1)
+        if self.index == "ivf":
+            self._arrays["lists"] = _MappedArray(self.directory / "lists.bin", np.int32, 1, fill=-1)
+
+    # Storage
+
+    def _quantize(self, vectors: np.ndarray) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+        if self.dtype == "binary":
+            return np.packbits(vectors > 0, axis=1), None
+        if self.dtype != "int8":
+            return vectors.astype(STORAGE_DTYPES[self.dtype]), None
+        scales = np.maximum(np.abs(vectors).max(axis=1, keepdims=True), 1e-12) / 127.0
+        return np.clip(np.rint(vectors / scales), -127, 127).astype(np.int8), scales.astype(np.float32)
+
+    def _vectors(self, ordinals) -> np.ndarray:
+        """Vectors as float32, dequantized from their stored type."""
+        stored = self._arrays["vectors"].array[ordinals]
+        if self.dtype == "binary":
+            # Sign bits become a +-1 unit vector, scored against the float query as is
+            bits = np.unpackbits(stored, axis=1, count=self.dim).astype(np.float32)
+            return (2.0 * bits - 1.0) / math.sqrt(self.dim)
+        # Only copies when the type changes; int8 rows are then scaled in that copy
+        stored = stored.astype(np.float32, copy=False)
+        if self.dtype == "int8":
+            stored *= self._arrays["scales"].array[ordinals]
+        return stored
+
+    def _scores(self, ordinals, query: np.ndarray) -> np.ndarray:
+        """Similarity of stored vectors to a query, without dequantizing them first.
+
+        Used for the large scans of flat and IVF search; equal to _vectors(ordinals) @ query.
+        """
+        stored = self._arrays["vectors"].array[ordinals]
+        if self.dtype == "binary":
+            # Per query, the sum of query components for every byte value at every byte position
+            width = stored.shape[1]
+            padded = np.zeros(width * 8, dtype=np.float32)
+            padded[:self.dim] = query
+            table = padded.reshape(width, 8) @ BYTE_BITS.T
+            set_bits = table[np.arange(width), stored].sum(axis=1)
+            return (2.0 * set_bits - padded.sum()) / math.sqrt(self.dim)
+        scores = stored.astype(np.float32, copy=False) @ query
+        if self.dtype == "int8":
+            # One scale per vector, so it can be applied to the dot product instead
+            scores *= self._arrays["scales"].array[ordinals, 0]
+        return scores
+
+    @staticmethod
+    def _normalize(vectors) -> np.ndarray:
+        vectors = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+        return vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+
+    def _lookup(self, ids: Sequence[str]) -> Dict[str, int]:
+        found = {}
+        for start in range(0, len(ids), 500):
+            batch = list(ids[start:start + 500])
+            rows = self._conn.execute(
+                f"SELECT id, ordinal FROM chunks WHERE id IN ({','.join('?' * len(batch))})", batch
+            ).fetchall()
+            found.update(rows)
+        return found
+
+    def upsert(self, ids, embeddings, documents):
+        vectors = self._normalize(embeddings)
+        with self._lock:
+            if self.dim is None:
+                self.dim = vectors.shape[1]
+                self._open_arrays()
+            elif vectors.shape[1] != self.dim:
+                raise ValueError(f"Expected {self.dim}-dim vectors, got {vectors.shape[1]}")
+
+            existing = self._lookup(ids)
+            rows = [
+                (doc_id, doc.page_content, json.dumps(doc.metadata))
+                for doc_id, doc in zip(ids, documents) if doc_id in existing
+            ]
+            self._conn.executemany("UPDATE chunks SET text = ?, metadata = ? WHERE id = ?",
+                                   [(text, metadata, doc_id) for doc_id, text, metadata in rows])
+
+            new, seen = [], set(existing)
+            for i, doc_id in enumerate(ids):
+                if doc_id not in seen:
+                    seen.add(doc_id)
+                    new.append(i)
+            if new:
+                first = self.size
+                ordinals = np.arange(first, first + len(new))
+                for mapped in self._arrays.values():
+                    mapped.reserve(first + len(new))
+                stored, scales = self._quantize(vectors[new])
+                self._arrays["vectors"].array[ordinals] = stored
+                if scales is not None:
+                    self._arrays["scales"].array[ordinals] = scales
+                if self.rescore:
+                    self._arrays["full"].array[ordinals] = vectors[new]
+                self._conn.executemany(
+                    "INSERT INTO chunks (ordinal, id, text, metadata) VALUES (?, ?, ?, ?)",
+                    [
+                        (int(ordinal), ids[i], documents[i].page_content, json.dumps(documents[i].metadata))
+                        for ordinal, i in zip(ordinals, new)
+                    ]
+                )
+                self.size += len(new)
+                if self.index == "hnsw":
+                    for ordinal in ordinals:
+                        self._hnsw_insert(int(ordinal))
+                elif self.index == "ivf":
+                    self._ivf_add(ordinals)
+            self._conn.commit()
+            self._save()
+
+    def delete(self, ids):
+        with self._lock:
+            ordinals = list(self._lookup(ids).values())
+            if not ordinals:
+                return
+            self._arrays["deleted"].array[ordinals] = 1
+            self._conn.executemany("DELETE FROM chunks WHERE ordinal = ?", [(o,) for o in ordinals])
+            self._dead += len(ordinals)
+            if self._dead > self.compact_ratio * max(self.size, 1):
+                self._compact()
+            self._conn.commit()
+            self._save()
+
+    def _compact(self):
+        """Drop tombstoned vectors, renumbering the live ones and shrinking the files."""
+        deleted = self._arrays["deleted"].array
+        live = np.flatnonzero(deleted[:self.size, 0] == 0)
+        if self.index == "hnsw":
+            self._unlink_deleted()
+            levels = {node: len(layers) for node, layers in self.upper.items() if not deleted[node, 0]}
+            if self.entry_point is not None and deleted[self.entry_point, 0]:
+                self.entry_point = max(levels, key=levels.get) if levels else (int(live[0]) if len(live) else None)
+                self.max_level = levels.get(self.entry_point, 0)
+
+        remap = np.full(self.size, -1, dtype=np.int64)
+        remap[live] = np.arange(len(live))
+        # Live ordinals only move down, so rows and SQL keys can be rewritten in place
+        for mapped in self._arrays.values():
+            mapped.array[:len(live)] = mapped.array[live]
+            mapped.shrink(len(live))
+        self._conn.executemany(
+            "UPDATE chunks SET ordinal = ? WHERE ordinal = ?",
+            [(new, int(old)) for new, old in enumerate(live) if new != old]
+        )
+        if self.index == "hnsw":
+            graph = self._arrays["graph"].array
+            graph[:] = np.where(graph >= 0, remap[graph], -1)
+            self.upper = {
+                int(remap[node]): [[int(remap[n]) for n in layer] for layer in layers]
+                for node, layers in self.upper.items() if remap[node] >= 0
+            }
+            if self.entry_point is not None:
+                self.entry_point = int(remap[self.entry_point])
+            self._write_json(self.directory / "upper.json", self.upper)
+            (self.directory / "upper.log").unlink(missing_ok=True)
+            self._dirty_upper.clear()
+            self._upper_logged = 0
+        self.size = len(live)
+        self.trained_size = min(self.trained_size, self.size)
+        self._dead = 0
+
+    def update_metadata(self, ids, metadatas):
+        with self._lock:
+            self._conn.executemany(
+                "UPDATE chunks SET metadata = ? WHERE id = ?",
+                [(json.dumps(metadata), doc_id) for doc_id, metadata in zip(ids, metadatas)]
+            )
+            self._conn.commit()
+
+    def _save(self):
+        for mapped in self._arrays.values():
+            mapped.flush()
+        meta = {
+            "index": self.index,
+            "dtype": self.dtype,
+            "m": self.m,
+            "nlist": self.nlist,
+            "rescore": self.rescore,
+            "dim": self.dim,
+            "size": self.size,
+            "entry_point": self.entry_point,
+            "max_level": self.max_level,
+            "trained_size": self.trained_size
+        }
+        self._write_json(self.meta_path, meta)
+        if self._dirty_upper:
+            self._save_upper()
+
+    def _save_upper(self):
+        """Append changed upper-layer nodes to a log, folded into upper.json once it outgrows it."""
+        changed = {node: self.upper[node] for node in self._dirty_upper}
+        self._dirty_upper.clear()
+        self._upper_logged += len(changed)
+        log_path = self.directory / "upper.log"
+        if self._upper_logged > max(len(self.upper), 1000):
+            self._write_json(self.directory / "upper.json", self.upper)
+            log_path.unlink(missing_ok=True)
+            self._upper_logged = 0
+            return
+        with open(log_path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(changed) + "\n")
+
+    @staticmethod
+    def _write_json(path: Path, data):
+        tmp_path = path.with_suffix(".tmp")
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f)
+        os.replace(tmp_path, path)
+
+    # Search
+
+    def search(self, embedding, k):
+        with self._lock:
+            hits = self.search_ordinals(embedding, k)
+            return [doc for _, doc in self._documents_at([ordinal for ordinal, _ in hits])]
+
+    def search_ordinals(self, embedding, k: int) -> List[Tuple[int, float]]:
+        """(ordinal, cosine similarity) of the k nearest live vectors, using the index."""
+        with self._lock:
+            if not self.size:
+                return []
+            query = self._normalize(embedding)[0]
+            candidates = k * self.rescore_factor if self.rescore else k
+            if self.index == "hnsw" and self.entry_point is not None:
+                hits = self._hnsw_search(query, candidates)
+            elif self.index == "ivf" and self.centroids is not None:
+                hits = self._ivf_search(query, candidates)
+            else:
+                hits = self._exact_search(query, candidates)
+            return self._rescored(query, hits, k)
+
+    def exact_search(self, embedding, k: int) -> List[Tuple[int, float]]:
+        """Exhaustive search over every live vector, without the index, rescored like search_ordinals."""
+        with self._lock:
+            query = self._normalize(embedding)[0]
+            candidates = k * self.rescore_factor if self.rescore else k
+            return self._rescored(query, self._exact_search(query, candidates), k)
+
+    def _rescored(self, query: np.ndarray, hits: List[Tuple[int, float]], k: int) -> List[Tuple[int, float]]:
+        """Re-rank quantized hits by their full-precision vectors."""
+        if not self.rescore or not hits:
+            return hits[:k]
+        ordinals = np.array(sorted(ordinal for ordinal, _ in hits))
+        scores = self._arrays["full"].array[ordinals] @ query
+        return self._ranked(ordinals, scores, k)
+
+    def _exact_search(self, query: np.ndarray, k: int) -> List[Tuple[int, float]]:
+        # Blocks of about 16 MB of float32: int8 blocks converted at 64 MB were three times slower
+        block_rows = max(1, (16 * 1024 ** 2) // (4 * self.dim))
+        best_ordinals = np.empty(0, dtype=np.int64)
+        best_scores = np.empty(0, dtype=np.float32)
+        deleted = self._arrays["deleted"].array
+        for start in range(0, self.size, block_rows):
+            stop = min(start + block_rows, self.size)
+            scores = self._scores(slice(start, stop), query)
+            scores[deleted[start:stop, 0] == 1] = -np.inf
+            best_ordinals = np.concatenate([best_ordinals, np.arange(start, stop)])
+            best_scores = np.concatenate([best_scores, scores])
+            if len(best_scores) > k:
+                keep = np.argpartition(best_scores, -k)[-k:]
+                best_ordinals, best_scores = best_ordinals[keep], best_scores[keep]
+        return self._ranked(best_ordinals, best_scores, k)
+
+    @staticmethod
+    def _ranked(ordinals: np.ndarray, scores: np.ndarray, k: int) -> List[Tuple[int, float]]:
+        order = np.argsort(scores)[::-1]
+        return [
+            (int(ordinals[i]), float(scores[i]))
+            for i in order[:k] if np.isfinite(scores[i])
+        ]
+
+    def _documents_at(self, ordinals: List[int]) -> List[Tuple[str, Document]]:
+        if not ordinals:
+            return []
+        rows = self._conn.execute(
+            f"SELECT ordinal, id, text, metadata FROM chunks WHERE ordinal IN ({','.join('?' * len(ordinals))})",
+            ordinals
+        ).fetchall()
+        by_ordinal = {row[0]: row[1:] for row in rows}
+        return [
+            (by_ordinal[o][0], Document(page_content=by_ordinal[o][1], metadata=json.loads(by_ordinal[o][2])))
+            for o in ordinals if o in by_ordinal
+        ]
+
+    def get_documents(self, ids):
+        with self._lock:
+            ordinals = list(self._lookup(ids).values())
+            return dict(self._documents_at(ordinals))
+
+    def get_embeddings(self, ids):
+        with self._lock:
+            found = self._lookup(ids)
+            if not found:
+                return {}
+            ordinals = list(found.values())
+            vectors = self._arrays["full"].array[ordinals] if self.rescore else self._vectors(ordinals)
+            return {doc_id: vector.tolist() for doc_id, vector in zip(found, vectors)}
+
+    def iter_texts(self, batch_size=10_000):
+        last = -1
+        while True:
+            with self._lock:
+                rows = self._conn.execute(
+                    "SELECT ordinal, id, text FROM chunks WHERE ordinal > ? ORDER BY ordinal LIMIT ?",
+                    (last, batch_size)
+                ).fetchall()
+            if not rows:
+                return
+            last = rows[-1][0]
+            yield [row[1] for row in rows], [row[2] or "" for row in rows]
+
+    def count(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM chunks").fetchone()[0]
+
+    def drop(self):
+        with self._lock:
+            self._conn.close()
+            self._arrays.clear()
+            shutil.rmtree(self.directory, ignore_errors=True)
+
+    def memory_bytes(self) -> int:
+        """Bytes of the vectors that searches scan, excluding the graph and the rescoring copy."""
+        if not self.dim:
+            return 0
+        if self.dtype == "binary":
+            per_vector = (self.dim + 7) // 8
+        else:
+            per_vector = self.dim * np.dtype(STORAGE_DTYPES[self.dtype]).itemsize
+        if self.dtype == "int8":
+            per_vector += 4
+        return per_vector * self.size
+
+    def rescore_bytes(self) -> int:
+        """Bytes of the float32 copy on disk; only candidate rows are ever paged in."""
+        return 4 * self.dim * self.size if self.rescore and self.dim else 0
+
+    # IVF
+
+    def train_ivf(self, iterations: int = 10, sample_size: int = 100_000):
+        """Cluster the stored vectors with k-means and rebuild the inverted lists."""
+        with self._lock:
+            live = np.flatnonzero(self._arrays["deleted"].array[:self.size, 0] == 0)
+            if not len(live):
+                return
+            nlist = self.nlist or int(min(max(4 * math.sqrt(len(live)), 16), 65_536))
+            nlist = min(nlist, len(live))
+            rng = np.random.default_rng(self.size)
+            sample = self._vectors(np.sort(rng.choice(live, min(sample_size, len(live)), replace=False)))
+            centroids = sample[rng.choice(len(sample), nlist, replace=False)]
+            for _ in range(iterations):
+                assignment = np.argmax(sample @ centroids.T, axis=1)
+                for c in range(nlist):
+                    members = sample[assignment == c]
+                    if len(members):
+                        centroids[c] = members.mean(axis=0)
+                centroids = self._normalize(centroids)
+            self.centroids = centroids
+            self.nlist = nlist
+            np.save(self.directory / "centroids.npy", centroids)
+            self._ivf_assign(np.arange(self.size))
+            self.trained_size = self.size
+            self._save()
+
+    def _ivf_add(self, ordinals: np.ndarray):
+        if self.centroids is None:
+            if self.size >= IVF_MIN_TRAIN_SIZE:
+                self.train_ivf()
+            return
+        # Lists drift as the corpus grows; recluster once it has doubled
+        if self.size >= 2 * self.trained_size:
+            self.train_ivf()
+            return
+        self._ivf_assign(ordinals)
+
+    def _ivf_assign(self, ordinals: np.ndarray, block_rows: int = 65_536):
+        lists = self._arrays["lists"].array
+        for start in range(0, len(ordinals), block_rows):
+            block = ordinals[start:start + block_rows]
+            lists[block, 0] = np.argmax(self._vectors(block) @ self.centroids.T, axis=1)
+
+    def _ivf_search(self, query: np.ndarray, k: int) -> List[Tuple[int, float]]:
+        probe = np.argsort(self.centroids @ query)[::-1][:self.nprobe]
+        lists = self._arrays["lists"].array[:self.size, 0]
+        deleted = self._arrays["deleted"].array[:self.size, 0]
+        candidates = np.flatnonzero(np.isin(lists, probe) & (deleted == 0))
+        if not len(candidates):
+            return []
+        scores = self._scores(candidates, query)
+        if len(scores) > k:
+            keep = np.argpartition(scores, -k)[-k:]
+            candidates, scores = candidates[keep], scores[keep]
+        return self._ranked(candidates, scores, k)
+
+    # HNSW
+
+    def _links(self, node: int, layer: int) -> List[int]:
+        if layer == 0:
+            row = self._arrays["graph"].array[node]
+            return row[row >= 0].tolist()
+        return self.upper[node][layer - 1]
+
+    def _set_links(self, node: int, layer: int, links: List[int]):
+        if layer == 0:
+            row = np.full(2 * self.m, -1, dtype=np.int32)
+            row[:len(links)] = links
+            self._arrays["graph"].array[node] = row
+        else:
+            self.upper[node][layer - 1] = list(links)
+            self._dirty_upper.add(node)
+
+    def _search_layer(self, query: np.ndarray,
+                      entry_points: List[int],
+                      ef: int,
+                      layer: int,
+                      live_only: bool = False) -> List[Tuple[float, int]]:
+        """Best-first search of one layer; returns up to ef (similarity, node), best first.
+
+        With live_only, tombstoned nodes are still walked through but never returned,
+        so they cannot take the place of live results within ef.
+        """
+        deleted = self._arrays["deleted"].array
+        visited = set(entry_points)
+        scores = self._vectors(entry_points) @ query
+        candidates = [(-float(s), n) for s, n in zip(scores, entry_points)]
+        results = [
+            (float(s), n) for s, n in zip(scores, entry_points)
+            if not (live_only and deleted[n, 0])
+        ]
+        heapq.heapify(candidates)
+        heapq.heapify(results)
+        while candidates:
+            negative, node = heapq.heappop(candidates)
+            if len(results) >= ef and -negative < results[0][0]:
+                break
+            neighbors = [n for n in self._links(node, layer) if n not in visited]
+            if not neighbors:
+                continue
+            visited.update(neighbors)
+            scores = self._vectors(neighbors) @ query
+            for score, neighbor in zip(scores.tolist(), neighbors):
+                if len(results) < ef or score > results[0][0]:
+                    heapq.heappush(candidates, (-score, neighbor))
+                    if live_only and deleted[neighbor, 0]:
+                        continue
+                    heapq.heappush(results, (score, neighbor))
+                    if len(results) > ef:
+                        heapq.heappop(results)
+        return sorted(results, reverse=True)
+
+    def _select_neighbors(self, candidates: List[Tuple[float, int]], m: int) -> List[int]:
+        """HNSW heuristic: prefer candidates not already covered by a closer pick."""
+        nodes = [node for _, node in candidates]
+        vectors = self._vectors(nodes)
+        # Each candidate's best similarity to anything picked so far, updated once per pick
+        covered = np.full(len(nodes), -np.inf, dtype=np.float32)
+        picked: List[int] = []
+        for i, (score, _) in enumerate(candidates):
+            if len(picked) >= m:
+                break
+            if covered[i] < score:
+                picked.append(i)
+                covered = np.maximum(covered, vectors @ vectors[i])
+        # Top up with the closest skipped candidates so nodes stay well connected
+        for i in range(len(candidates)):
+            if len(picked) >= m:
+                break
+            if i not in picked:
+                picked.append(i)
+        return [nodes[i] for i in picked]
+
+    def _hnsw_insert(self, node: int):
+        level = int(-math.log(1.0 - self._random.random()) * self._level_mult)
+        if level:
+            self.upper[node] = [[] for _ in range(level)]
+            self._dirty_upper.add(node)
+        if self.entry_point is None:
+            self.entry_point, self.max_level = node, level
+            return
+
+        query = self._vectors([node])[0]
+        entry = [self.entry_point]
+        for layer in range(self.max_level, level, -1):
+            entry = [self._search_layer(query, entry, 1, layer)[0][1]]
+        deleted = self._arrays["deleted"].array
+        for layer in range(min(level, self.max_level), -1, -1):
+            # New nodes never link to tombstoned ones, which compaction would drop anyway
+            found = self._search_layer(query, entry, self.ef_construction, layer, live_only=True)
+            neighbors = self._select_neighbors(found, self.m)
+            self._set_links(node, layer, neighbors)
+            max_links = 2 * self.m if layer == 0 else self.m
+            for neighbor in neighbors:
+                links = [n for n in self._links(neighbor, layer) if not deleted[n, 0]] + [node]
+                if len(links) > max_links:
+                    scores = self._vectors(links) @ self._vectors([neighbor])[0]
+                    ranked = sorted(zip(scores.tolist(), links), reverse=True)
+                    links = self._select_neighbors(ranked, max_links)
+                self._set_links(neighbor, layer, links)
+            entry = [n for _, n in found] or entry
+        if level > self.max_level:
+            self.entry_point, self.max_level = node, level
+
+    def _hnsw_search(self, query: np.ndarray, k: int) -> List[Tuple[int, float]]:
+        entry = [self.entry_point]
+        for layer in range(self.max_level, 0, -1):
+            entry = [self._search_layer(query, entry, 1, layer)[0][1]]
+        found = self._search_layer(query, entry, max(self.ef_search, k), 0, live_only=True)
+        return [(node, score) for score, node in found[:k]]
+
+    def _unlink_deleted(self):
+        """Relink live nodes past their tombstoned neighbors before those are compacted away."""
+        deleted = self._arrays["deleted"].array
+        graph = self._arrays["graph"].array[:self.size]
+        dead_links = (graph >= 0) & (deleted[np.maximum(graph, 0), 0] == 1)
+        for layer in range(self.max_level + 1):
+            if layer == 0:
+                nodes = np.flatnonzero(dead_links.any(axis=1) & (deleted[:self.size, 0] == 0)).tolist()
+                max_links = 2 * self.m
+            else:
+                nodes = [
+                    node for node, layers in self.upper.items()
+                    if len(layers) >= layer and not deleted[node, 0]
+                    and any(deleted[n, 0] for n in layers[layer - 1])
+                ]
+                max_links = self.m
+            for node in nodes:
+                candidates = self._live_neighborhood(node, layer)
+                if candidates:
+                    scores = self._vectors(candidates) @ self._vectors([node])[0]
+                    ranked = sorted(zip(scores.tolist(), candidates), reverse=True)
+                    candidates = self._select_neighbors(ranked, max_links)
+                self._set_links(node, layer, candidates)
+
+    def _live_neighborhood(self, node: int, layer: int) -> List[int]:
+        """Live nodes reachable from a node's links through tombstoned nodes only."""
+        deleted = self._arrays["deleted"].array
+        found, seen = [], {node}
+        queue = list(self._links(node, layer))
+        i = 0
+        while i < len(queue) and len(found) < self.ef_construction:
+            neighbor = queue[i]
+            i += 1
+            if neighbor in seen:
+                continue
+            seen.add(neighbor)
+            if deleted[neighbor, 0]:
+                queue.extend(self._links(neighbor, layer))
+            else:
+                found.append(neighbor)
+        return found
@@ -0,0 +1,117 @@
+from langchain_huggingface import HuggingFaceEmbeddings
+from langchain_ollama import OllamaLLM
+from typing import Dict, Optional, Tuple
+import json
+import os
+import threading
+import torch
+
+DEFAULT_EMBEDDING_MODEL = "sentence-transformers/paraphrase-multilingual-mpnet-base-v2"
+
+# Process-wide handles shared by every RAGPipeline (and so every Streamlit session)
+_embeddings: Dict[Tuple, HuggingFaceEmbeddings] = {}
+_llms: Dict[Tuple, OllamaLLM] = {}
+_tokenizers: Dict[str, Tuple] = {}
+_cross_encoders: Dict[Tuple, object] = {}
+_embeddings_lock = threading.Lock()
+_llms_lock = threading.Lock()
+_tokenizers_lock = threading.Lock()
+_cross_encoders_lock = threading.Lock()
+
+
+def get_device() -> str:
+    """Return the torch device models should be loaded on."""
+    return 'cuda' if torch.cuda.is_available() else 'cpu'
+
+
+def set_torch_threads(num_threads: Optional[int] = None) -> int:
+    """Size torch's intra-op CPU pool, one thread per core by default."""
+    num_threads = num_threads or os.cpu_count() or 1
+    if torch.get_num_threads() != num_threads:
+        torch.set_num_threads(num_threads)
+    return num_threads
+
+
+def get_embeddings(model_name: str,
+                   normalize: bool = True,
+                   batch_size: int = 32) -> HuggingFaceEmbeddings:
+    """Load an embedding model once per process and return a handle that encodes in batch_size batches."""
+    key = (model_name, normalize)
+    embeddings = _embeddings.get(key)
+    if embeddings is None:
+        with _embeddings_lock:
+            # Another thread may have finished loading while we waited
+            if key not in _embeddings:
+                _embeddings[key] = HuggingFaceEmbeddings(
+                    model_name=model_name,
+                    model_kwargs={"device": get_device()},
+                    encode_kwargs={"normalize_embeddings": normalize, "batch_size": 32}
+                )
+            embeddings = _embeddings[key]
+
+    if embeddings.encode_kwargs["batch_size"] == batch_size:
+        return embeddings
+    # A shallow copy shares the loaded model; only its encode settings differ
+    return embeddings.model_copy(
+        update={"encode_kwargs": {**embeddings.encode_kwargs, "batch_size": batch_size}}
+    )
+
+
+def get_llm(model: str = "phi3:mini",
+            temperature: float = 0.3) -> OllamaLLM:
+    """Build an Ollama client once per process and return the shared handle."""
+    key = (model, temperature)
+    llm = _llms.get(key)
+    if llm is not None:
+        return llm
+
+    with _llms_lock:
+        if key not in _llms:
+            _llms[key] = OllamaLLM(
+                model=model,
+                temperature=temperature,
+                num_gpu=1 if get_device() == 'cuda' else 0
+            )
+        return _llms[key]
+
+
+def get_cross_encoder(model_name: str, device: str = "cpu", max_length: int = 512):
+    """Load a re-ranking cross-encoder once per process and return the shared handle."""
+    key = (model_name, device, max_length)
+    model = _cross_encoders.get(key)
+    if model is not None:
+        return model
+
+    with _cross_encoders_lock:
+        if key not in _cross_encoders:
+            from sentence_transformers import CrossEncoder
+            _cross_encoders[key] = CrossEncoder(model_name, device=device, max_length=max_length)
+        return _cross_encoders[key]
+
+
+def get_tokenizer(model_name: str = DEFAULT_EMBEDDING_MODEL):
+    """Return an embedding model's tokenizer and its max sequence length, loaded once per process.
+
+    Only the tokenizer is loaded, so parser processes can measure chunks in tokens
+    without holding a copy of the model weights.
+    """
+    entry = _tokenizers.get(model_name)
+    if entry is not None:
+        return entry
+
+    with _tokenizers_lock:
+        if model_name not in _tokenizers:
+            from transformers import AutoTokenizer
+            tokenizer = AutoTokenizer.from_pretrained(model_name)
+            _tokenizers[model_name] = (tokenizer, _max_seq_length(model_name, tokenizer))
+        return _tokenizers[model_name]
+
+
+def _max_seq_length(model_name: str, tokenizer) -> int:
+    """The sentence-transformers limit, which is often lower than the tokenizer's own."""
+    try:
+        from huggingface_hub import hf_hub_download
+        with open(hf_hub_download(model_name, "sentence_bert_config.json"), 'r', encoding='utf-8') as f:
+            return int(json.load(f)["max_seq_length"])
+    except Exception:
+        return min(tokenizer.model_max_length, 512)
@@ -0,0 +1,204 @@
+import hashlib
+import io
+import math
+import os
+import sqlite3
+import tempfile
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, Iterator, Optional, Tuple, Union
+import fitz  # PDF rasterization
+import pytesseract  # OCR
+from PIL import Image, ImageOps  # Image processing
+
+
+class OCRCache:
+    """Persistent OCR results keyed by image hash, language, config and preprocessing."""
+
+    def __init__(self, path: Union[str, Path]):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        # Opened from pool workers too, so rely on SQLite's own locking
+        self._conn = sqlite3.connect(self.path, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS ocr_results (key TEXT PRIMARY KEY, text TEXT NOT NULL)"
+        )
+        self._conn.commit()
+
+    @staticmethod
+    def make_key(image_fingerprint: bytes, settings: Dict) -> str:
+        image_hash = hashlib.sha256(image_fingerprint).hexdigest()
+        options = "|".join(str(settings[name]) for name in (
+            "lang", "config", "grayscale", "binarize_threshold", "max_pixels"
+        ))
+        return f"{image_hash}:{hashlib.sha256(options.encode()).hexdigest()[:16]}"
+
+    def get(self, key: str) -> Optional[str]:
+        row = self._conn.execute(
+            "SELECT text FROM ocr_results WHERE key = ?", (key,)
+        ).fetchone()
+        return row[0] if row else None
+
+    def put(self, key: str, text: str):
+        self._conn.execute(
+            "INSERT OR REPLACE INTO ocr_results (key, text) VALUES (?, ?)", (key, text)
+        )
+        self._conn.commit()
+
+    def close(self):
+        self._conn.close()
+
+
+def preprocess_image(image: Image.Image,
+                     grayscale: bool = True,
+                     binarize_threshold: Optional[int] = None,
+                     max_pixels: Optional[int] = None) -> Image.Image:
+    """Downscale oversized images and optionally grayscale/binarize before OCR."""
+    if max_pixels and image.width * image.height > max_pixels:
+        scale = math.sqrt(max_pixels / (image.width * image.height))
+        image = image.resize(
+            (max(1, int(image.width * scale)), max(1, int(image.height * scale))),
+            Image.LANCZOS
+        )
+    if grayscale or binarize_threshold is not None:
+        image = ImageOps.grayscale(image)
+    if binarize_threshold is not None:
+        image = image.point(lambda p: 255 if p > binarize_threshold else 0)
+    return image
+
+
+def _ocr_with_cache(image: Image.Image, fingerprint: bytes, settings: Dict) -> str:
+    """OCR an image unless an identical one was already read with the same settings."""
+    # Workers may be spawned fresh, so the tesseract path has to travel with the settings
+    pytesseract.pytesseract.tesseract_cmd = settings["tesseract_cmd"]
+    cache = OCRCache(settings["cache_path"]) if settings["cache_path"] else None
+    try:
+        key = OCRCache.make_key(fingerprint, settings)
+        if cache is not None:
+            text = cache.get(key)
+            if text is not None:
+                return text
+
+        image = preprocess_image(
+            image,
+            grayscale=settings["grayscale"],
+            binarize_threshold=settings["binarize_threshold"],
+            max_pixels=settings["max_pixels"]
+        )
+        text = pytesseract.image_to_string(
+            image, lang=settings["lang"], config=settings["config"]
+        )
+        if cache is not None:
+            cache.put(key, text)
+        return text
+    finally:
+        if cache is not None:
+            cache.close()
+
+
+def _ocr_pdf_page(task: Tuple[str, int, Dict]) -> str:
+    """Process-pool worker: rasterize one PDF page and OCR it."""
+    pdf_path, page_index, settings = task
+    with fitz.open(pdf_path) as doc:
+        pixmap = doc[page_index].get_pixmap(dpi=settings["dpi"], alpha=False)
+    image = Image.frombytes("RGB", (pixmap.width, pixmap.height), pixmap.samples)
+    fingerprint = f"{pixmap.width}x{pixmap.height}:".encode() + pixmap.samples
+    return _ocr_with_cache(image, fingerprint, settings)
+
+
+class OCREngine:
+    """Rasterizes PDF pages with fitz and OCRs them across a process pool."""
+
+    def __init__(self, dpi: int = 300,
+                 max_workers: Optional[int] = None,
+                 lang: str = "eng",
+                 config: str = "",
+                 tesseract_cmd: Optional[str] = None,
+                 cache_path: Optional[Union[str, Path]] = "./chroma_db/ocr_cache.sqlite",
+                 grayscale: bool = True,
+                 binarize_threshold: Optional[int] = None,
+                 max_pixels: Optional[int] = 12_000_000):
+        self.dpi = dpi
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.lang = lang
+        self.config = config
+        self.tesseract_cmd = tesseract_cmd or pytesseract.pytesseract.tesseract_cmd
+        self.cache_path = str(cache_path) if cache_path else None
+        self.grayscale = grayscale
+        self.binarize_threshold = binarize_threshold
+        self.max_pixels = max_pixels
+
+    def ocr_image(self, image_input) -> str:
+        """OCR a single image given as a path or file-like object."""
+        if isinstance(image_input, (str, Path)):
+            with open(image_input, 'rb') as f:
+                data = f.read()
+        else:
+            data = image_input.read()
+        with Image.open(io.BytesIO(data)) as image:
+            return _ocr_with_cache(image, data, self._settings())
+
+    def _settings(self) -> Dict:
+        """Plain, picklable settings shared with pool workers."""
+        return {
+            "dpi": self.dpi,
+            "lang": self.lang,
+            "config": self.config,
+            "tesseract_cmd": self.tesseract_cmd,
+            "cache_path": self.cache_path,
+            "grayscale": self.grayscale,
+            "binarize_threshold": self.binarize_threshold,
+            "max_pixels": self.max_pixels
+        }
+
+    def iter_pdf_pages(self, pdf_input: Union[str, Path, bytes],
+                       only_missing_text: bool = True) -> Iterator[Tuple[int, str]]:
+        """Yield (page number, text) in page order, OCRing pages without a text layer.
+
+        With only_missing_text=False every page is OCRed, ignoring any text layer.
+        """
+        temp_path = None
+        if isinstance(pdf_input, bytes):
+            # Workers reopen the file themselves; a path is far cheaper to pickle
+            with tempfile.NamedTemporaryFile(suffix=".pdf", delete=False) as f:
+                f.write(pdf_input)
+                temp_path = f.name
+            pdf_input = temp_path
+
+        try:
+            yield from self._iter_pages(str(pdf_input), only_missing_text)
+        finally:
+            if temp_path is not None:
+                os.remove(temp_path)
+
+    def _iter_pages(self, pdf_path: str,
+                    only_missing_text: bool) -> Iterator[Tuple[int, str]]:
+        # Bound how far text extraction may run ahead of outstanding OCR jobs
+        window = 2 * self.max_workers
+        settings = self._settings()
+        pending = deque()
+        with ProcessPoolExecutor(max_workers=self.max_workers) as pool, \
+                fitz.open(pdf_path) as doc:
+            for page in doc:
+                text = page.get_text() if only_missing_text else ""
+                if text.strip():
+                    pending.append((page.number + 1, text))
+                else:
+                    task = (pdf_path, page.number, settings)
+                    pending.append((page.number + 1, pool.submit(_ocr_pdf_page, task)))
+
+                while pending and (not isinstance(pending[0][1], Future)
+                                   or len(pending) > window):
+                    yield self._resolve(pending.popleft())
+
+            while pending:
+                yield self._resolve(pending.popleft())
+
+    @staticmethod
+    def _resolve(entry: Tuple[int, Union[str, Future]]) -> Tuple[int, str]:
+        page_number, result = entry
+        if isinstance(result, Future):
+            result = result.result()
+        return page_number, result
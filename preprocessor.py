@@ -1,108 +1,364 @@
-import fitz  # PDF
 import docx  # DOCX
 import pandas as pd  # CSV
 import sqlite3  # SQLite databases
 import pytesseract  # OCR
-from PIL import Image  # Image processing
 import io
-import requests
+import bisect
+import csv
+import itertools
 from pathlib import Path
-from typing import List, Dict, Union, Optional
+from typing import List, Dict, Iterator, Tuple, Union, Optional
 from langchain_core.documents import Document
 from langchain_text_splitters import CharacterTextSplitter
+from chunker import ChunkStats, TokenChunker
+from model_registry import DEFAULT_EMBEDDING_MODEL, get_tokenizer
+from ocr_engine import OCREngine
+from url_fetcher import URLFetcher
+from html_extractor import extract_sections, looks_like_html
 
 class FilePreprocessor:
-    def __init__(self):
-        self.supported_extensions = {
-            '.pdf', '.txt', '.docx', '.csv', 
-            '.db', '.sqlite', '.sqlite3',
-            '.jpg', '.jpeg', '.png'
-        }
+    SUPPORTED_EXTENSIONS = frozenset({
+        '.pdf', '.txt', '.docx', '.csv', 
+        '.db', '.sqlite', '.sqlite3',
+        '.jpg', '.jpeg', '.png'
+    })
+
+    def __init__(self, ocr_dpi: int = 300,
+                 ocr_workers: Optional[int] = None,
+                 ocr_lang: str = "eng",
+                 ocr_cache_path: Optional[str] = "./chroma_db/ocr_cache.sqlite",
+                 ocr_binarize_threshold: Optional[int] = None,
+                 ocr_max_pixels: Optional[int] = 12_000_000,
+                 db_mode: str = "rows",
+                 db_max_rows_per_table: Optional[int] = None,
+                 db_row_caps: Optional[Dict[str, int]] = None,
+                 db_page_rows: int = 1000,
+                 url_fetcher: Optional[URLFetcher] = None,
+                 embedding_model: Optional[str] = DEFAULT_EMBEDDING_MODEL,
+                 chunk_tokens: Optional[int] = None,
+                 chunk_overlap_tokens: int = 16):
+        if db_mode not in ("rows", "schema"):
+            raise ValueError(f"Unsupported SQLite ingestion mode: {db_mode}")
+        self.supported_extensions = set(self.SUPPORTED_EXTENSIONS)
         pytesseract.pytesseract.tesseract_cmd = r'C:\Program Files\Tesseract-OCR\tesseract.exe'  # Update this path as needed
+        self.ocr_engine = OCREngine(
+            dpi=ocr_dpi,
+            max_workers=ocr_workers,
+            lang=ocr_lang,
+            tesseract_cmd=pytesseract.pytesseract.tesseract_cmd,
+            cache_path=ocr_cache_path,
+            binarize_threshold=ocr_binarize_threshold,
+            max_pixels=ocr_max_pixels
+        )
+        # "rows" indexes every row (up to the caps); "schema" only schema and samples
+        self.db_mode = db_mode
+        self.db_max_rows_per_table = db_max_rows_per_table
+        self.db_row_caps = db_row_caps or {}
+        self.db_page_rows = db_page_rows
+        self.url_fetcher = url_fetcher or URLFetcher()
+        # Chunks are measured in the embedding model's tokens so none are cut off at
+        # its sequence limit; without a model the character chunk_size is used instead
+        self.chunker = None
+        if embedding_model:
+            tokenizer, max_tokens = get_tokenizer(embedding_model)
+            self.chunker = TokenChunker(
+                tokenizer, max_tokens, chunk_tokens, chunk_overlap_tokens
+            )
 
     def process_file(self, file_input: Union[str, Path], 
                     is_url: bool = False,
-                    chunk_size: int = 1000,
-                    chunk_overlap: int = 200,
-                    metadata: Optional[Dict] = None) -> List[Document]:
+                    chunk_size: Optional[int] = None,
+                    chunk_overlap: Optional[int] = None,
+                    metadata: Optional[Dict] = None,
+                    stats: Optional[ChunkStats] = None) -> List[Document]:
         """Process files into LangChain Documents with metadata."""
-        content = self._extract_content(file_input, is_url)
-        chunks = self._chunk_content(content, chunk_size, chunk_overlap)
-        
-        return [
-            Document(
-                page_content=chunk,
-                metadata=metadata or {"source": str(file_input)}
+        return list(self.iter_documents(
+            file_input, is_url, chunk_size, chunk_overlap, metadata, stats
+        ))
+
+    def new_chunk_stats(self) -> Optional[ChunkStats]:
+        """Collector for chunk token lengths; None when chunking by characters."""
+        return self.chunker.new_stats() if self.chunker else None
+
+    def iter_documents(self, file_input: Union[str, Path],
+                       is_url: bool = False,
+                       chunk_size: Optional[int] = None,
+                       chunk_overlap: Optional[int] = None,
+                       metadata: Optional[Dict] = None,
+                       stats: Optional[ChunkStats] = None) -> Iterator[Document]:
+        """Yield Documents one chunk at a time so ingestion can stream them.
+
+        chunk_size and chunk_overlap are characters and only apply without an embedding
+        model; token chunking is configured with chunk_tokens and chunk_overlap_tokens.
+        """
+        if self.chunker is not None and (chunk_size is not None or chunk_overlap is not None):
+            raise ValueError(
+                "chunk_size/chunk_overlap are character settings; with an embedding model "
+                "set chunk_tokens/chunk_overlap_tokens on FilePreprocessor instead"
             )
-            for chunk in chunks
-        ]
+        chunk_size = 1000 if chunk_size is None else chunk_size
+        chunk_overlap = 200 if chunk_overlap is None else chunk_overlap
+        documents = self._iter_documents(file_input, is_url, chunk_size, chunk_overlap, metadata)
+        if stats is None or self.chunker is None:
+            yield from documents
+            return
+        for document in documents:
+            stats.record(self.chunker.length(document.page_content))
+            yield document
 
-    def _extract_content(self, file_input: Union[str, Path], 
-                         is_url: bool) -> str:
-        """Extract content from various file formats."""
+    def _iter_documents(self, file_input: Union[str, Path],
+                        is_url: bool,
+                        chunk_size: int,
+                        chunk_overlap: int,
+                        metadata: Optional[Dict]) -> Iterator[Document]:
+        base_metadata = metadata or {"source": str(file_input)}
         if is_url:
-            return self._extract_from_url(file_input)
-        
-        file_path = Path(file_input)
+            yield from self._iter_url_documents(str(file_input), chunk_size, chunk_overlap, base_metadata)
+            return
+
+        file_ext = Path(file_input).suffix.lower()
+        if file_ext == '.pdf':
+            # PDFs are read page by page so memory stays bounded by a few pages
+            pages = self._iter_pdf_pages(Path(file_input))
+            yield from self._chunk_pages(pages, chunk_size, chunk_overlap, base_metadata)
+            return
+        if file_ext == '.csv':
+            yield from self._iter_csv_documents(Path(file_input), chunk_size, base_metadata)
+            return
+        if file_ext in ('.db', '.sqlite', '.sqlite3') and self.db_mode == "rows":
+            yield from self._iter_db_documents(Path(file_input), chunk_size, base_metadata)
+            return
+
+        content = self._extract_content(Path(file_input))
+
+        fmt = "docx" if file_ext == '.docx' else "text"
+        chunks = self._chunk_content(content, chunk_size, chunk_overlap, fmt)
+        for chunk in chunks:
+            yield Document(
+                page_content=chunk,
+                metadata=dict(base_metadata)
+            )
+
+    def _extract_content(self, file_path: Path) -> str:
+        """Extract text from the formats that are chunked as a single document."""
         file_ext = file_path.suffix.lower()
         
         if file_ext not in self.supported_extensions:
             raise ValueError(f"Unsupported file type: {file_ext}")
         
-        if file_ext == '.pdf':
-            text = self._extract_from_pdf(file_path)
-            if not text.strip():
-                text = self._extract_with_ocr(file_path)
-            return text
-        elif file_ext == '.txt':
+        if file_ext == '.txt':
             with open(file_path, 'r', encoding='utf-8') as f:
                 return f.read()
         elif file_ext == '.docx':
-            doc = docx.Document(file_path)
-            return "\n".join([para.text for para in doc.paragraphs])
-        elif file_ext == '.csv':
-            return pd.read_csv(file_path).to_string()
+            return self._extract_from_docx(file_path)
         elif file_ext in ('.db', '.sqlite', '.sqlite3'):
             return self._extract_from_db(file_path)
         elif file_ext in ('.jpg', '.jpeg', '.png'):
             return self._extract_with_ocr(file_path)
 
-    def _extract_from_url(self, url: str) -> str:
-        """Extract content from URL."""
-        response = requests.get(url)
-        response.raise_for_status()
-        
-        content_type = response.headers.get('content-type', '').lower()
-        
+    @staticmethod
+    def _extract_from_docx(docx_path: Path) -> str:
+        """Extract paragraphs, marking headings with '#' so chunks can break on them."""
+        lines = []
+        for para in docx.Document(docx_path).paragraphs:
+            style = para.style.name if para.style is not None else ""
+            if style.startswith("Heading") and para.text.strip():
+                level = style.split()[-1]
+                lines.append("#" * (int(level) if level.isdigit() else 1) + " " + para.text)
+            else:
+                lines.append(para.text)
+        return "\n".join(lines)
+
+    def _iter_url_documents(self, url: str,
+                            chunk_size: int,
+                            chunk_overlap: int,
+                            metadata: Dict) -> Iterator[Document]:
+        """Chunk a URL, keeping page numbers for PDFs and section headings for HTML."""
+        response = self.url_fetcher.fetch(url)
+        content_type = response.content_type
+
         if 'pdf' in content_type:
-            with io.BytesIO(response.content) as pdf_file:
-                doc = fitz.open(stream=pdf_file.read(), filetype="pdf")
-                text = " ".join(page.get_text() for page in doc)
-                if not text.strip():
-                    text = self._extract_with_ocr(pdf_file)
-                return text
+            pages = self.ocr_engine.iter_pdf_pages(response.content)
+            yield from self._chunk_pages(pages, chunk_size, chunk_overlap, metadata)
         elif any(img_type in content_type for img_type in ['jpg', 'jpeg', 'png']):
-            image = Image.open(io.BytesIO(response.content))
-            return pytesseract.image_to_string(image)
+            text = self._extract_with_ocr(io.BytesIO(response.content))
+            for chunk in self._chunk_content(text, chunk_size, chunk_overlap):
+                yield Document(page_content=chunk, metadata=dict(metadata))
+        elif looks_like_html(content_type, response.text):
+            # Only main-content text is embedded; markup and page chrome are dropped
+            for section, text in extract_sections(response.text):
+                for chunk in self._chunk_content(text, chunk_size, chunk_overlap):
+                    yield Document(
+                        page_content=chunk,
+                        metadata={**metadata, "format": "html", "section": section}
+                    )
         else:
-            return response.text
+            for chunk in self._chunk_content(response.text, chunk_size, chunk_overlap):
+                yield Document(page_content=chunk, metadata=dict(metadata))
+
+    def _iter_pdf_pages(self, pdf_path: Path) -> Iterator[Tuple[int, str]]:
+        """Lazily yield (page number, text) pairs, OCRing pages with no text layer."""
+        return self.ocr_engine.iter_pdf_pages(pdf_path)
 
-    def _extract_from_pdf(self, pdf_path: Path) -> str:
-        """Extract text from PDF using PyMuPDF."""
-        doc = fitz.open(pdf_path)
-        return " ".join(page.get_text() for page in doc)
+    def _chunk_pages(self, pages: Iterator[Tuple[int, str]],
+                     chunk_size: int,
+                     chunk_overlap: int,
+                     metadata: Dict) -> Iterator[Document]:
+        """Chunk a stream of pages, letting chunks span page boundaries."""
+        buffer = ""
+        buffer_start = 0  # document offset of buffer[0]
+        buffer_length = 0  # in the chunker's units, so tokens when a model is set
+        limit = self.chunker.chunk_tokens if self.chunker else chunk_size
+        page_starts: List[Tuple[int, int]] = []  # (document offset, page number)
+
+        def emit(chunks: List[str]) -> Iterator[Tuple[Document, int]]:
+            search_from = 0
+            for chunk in chunks:
+                # The splitter strips whitespace, so locate chunks by their first piece
+                probe = chunk.split("\n\n", 1)[0]
+                position = buffer.find(probe, search_from)
+                if position < 0:
+                    position = search_from
+                search_from = position + 1
+                start = buffer_start + position
+                end = start + len(chunk)
+                yield Document(
+                    page_content=chunk,
+                    metadata={
+                        **metadata,
+                        "page": self._page_at(page_starts, start),
+                        "page_end": self._page_at(page_starts, end - 1),
+                        "start_index": start,
+                        "end_index": end
+                    }
+                ), position
+
+        for page_number, text in pages:
+            if not text.strip():
+                continue
+            if buffer:
+                buffer += "\n\n"
+            page_starts.append((buffer_start + len(buffer), page_number))
+            buffer += text
+            buffer_length += self._length(text)
+
+            if buffer_length < 2 * limit:
+                continue
+            # Emit everything but the last chunk; it may still grow with the next page
+            chunks = self._chunk_content(buffer, chunk_size, chunk_overlap)
+            if len(chunks) < 2:
+                continue
+            last_position = 0
+            for document, position in emit(chunks[:-1]):
+                last_position = position
+                yield document
+            tail_start = buffer.find(chunks[-1].split("\n\n", 1)[0], last_position + 1)
+            if tail_start < 0:
+                tail_start = last_position
+            buffer = buffer[tail_start:]
+            buffer_start += tail_start
+            buffer_length = self._length(buffer)
+            page_starts = [
+                entry for i, entry in enumerate(page_starts)
+                if i + 1 == len(page_starts) or page_starts[i + 1][0] > buffer_start
+            ]
+
+        if buffer.strip():
+            for document, _ in emit(self._chunk_content(buffer, chunk_size, chunk_overlap)):
+                yield document
+
+    @staticmethod
+    def _page_at(page_starts: List[Tuple[int, int]], offset: int) -> int:
+        """Page number containing a document offset."""
+        index = bisect.bisect_right([start for start, _ in page_starts], offset) - 1
+        return page_starts[max(index, 0)][1]
 
     def _extract_with_ocr(self, file_input: Union[Path, io.BytesIO]) -> str:
-        """Extract text using OCR."""
-        if isinstance(file_input, (Path, str)):
-            image = Image.open(file_input)
-        else:  # BytesIO
-            image = Image.open(file_input)
-        return pytesseract.image_to_string(image)
+        """Extract text from an image using OCR."""
+        return self.ocr_engine.ocr_image(file_input)
+
+    def _iter_csv_documents(self, csv_path: Path,
+                            chunk_size: int,
+                            metadata: Dict,
+                            batch_rows: int = 10_000) -> Iterator[Document]:
+        """Stream a CSV in row batches and emit row groups that repeat the header."""
+        reader = pd.read_csv(
+            csv_path, chunksize=batch_rows, dtype=str, keep_default_na=False
+        )
+        header = None
+
+        def rows() -> Iterator[Tuple[int, str]]:
+            nonlocal header
+            line = io.StringIO()
+            writer = csv.writer(line, lineterminator="")
+            row_number = 0
+            for frame in reader:
+                if header is None:
+                    writer.writerow(frame.columns)
+                    header = line.getvalue()
+                    line.seek(0)
+                    line.truncate()
+                for row in frame.itertuples(index=False, name=None):
+                    row_number += 1
+                    writer.writerow(row)
+                    yield row_number, line.getvalue()
+                    line.seek(0)
+                    line.truncate()
+
+        row_iter = rows()
+        first_row = next(row_iter, None)
+        if first_row is None:
+            return
+        yield from self._group_rows(
+            header, itertools.chain([first_row], row_iter), chunk_size,
+            {**metadata, "format": "csv"}, "row"
+        )
+
+    def _group_rows(self, header: str,
+                    rows: Iterator[Tuple[int, str]],
+                    chunk_size: int,
+                    metadata: Dict,
+                    index_name: str) -> Iterator[Document]:
+        """Pack numbered rows under a header into Documents of about chunk_size.
+
+        Rows are never split, so a group always holds whole rows under its header.
+        """
+        limit = self.chunker.chunk_tokens if self.chunker else chunk_size
+        group: List[str] = []
+        first = last = None
+        header_size = self._length(header)
+        size = header_size
+        for number, line in rows:
+            line_size = self._length(line) + 1
+            if group and size + line_size > limit:
+                yield self._row_group_document(header, group, first, last, metadata, index_name)
+                group = []
+                size = header_size
+            if not group:
+                first = number
+            group.append(line)
+            last = number
+            size += line_size
+        if group:
+            yield self._row_group_document(header, group, first, last, metadata, index_name)
+
+    @staticmethod
+    def _row_group_document(header: str, lines: List[str],
+                            first, last,
+                            metadata: Dict,
+                            index_name: str) -> Document:
+        return Document(
+            page_content="\n".join([header] + lines),
+            metadata={
+                **metadata,
+                f"{index_name}_start": first,
+                f"{index_name}_end": last
+            }
+        )
 
     def _extract_from_db(self, db_path: Path) -> str:
         """Extract schema and sample data from SQLite database."""
-        conn = sqlite3.connect(db_path)
+        conn = self._connect_read_only(db_path)
         cursor = conn.cursor()
         
         cursor.execute("SELECT name FROM sqlite_master WHERE type='table';")
@@ -113,13 +369,13 @@ class FilePreprocessor:
             table_name = table[0]
             result.append(f"\nTable: {table_name}")
             
-            cursor.execute(f"PRAGMA table_info({table_name});")
+            cursor.execute(f"PRAGMA table_info({self._quote(table_name)});")
             columns = cursor.fetchall()
             result.append("Columns:")
             for col in columns:
                 result.append(f"  {col[1]} ({col[2]})")
             
-            cursor.execute(f"SELECT * FROM {table_name} LIMIT 5;")
+            cursor.execute(f"SELECT * FROM {self._quote(table_name)} LIMIT 5;")
             rows = cursor.fetchall()
             if rows:
                 result.append("Sample data:")
@@ -129,10 +385,98 @@ class FilePreprocessor:
         conn.close()
         return "\n".join(result)
 
+    def _iter_db_documents(self, db_path: Path,
+                           chunk_size: int,
+                           metadata: Dict) -> Iterator[Document]:
+        """Page through every table and emit a schema Document plus row groups."""
+        conn = self._connect_read_only(db_path)
+        try:
+            tables = [row[0] for row in conn.execute(
+                "SELECT name FROM sqlite_master "
+                "WHERE type='table' AND name NOT LIKE 'sqlite_%' ORDER BY name"
+            )]
+            for table in tables:
+                columns = conn.execute(f"PRAGMA table_info({self._quote(table)})").fetchall()
+                column_names = [col[1] for col in columns]
+                table_metadata = {
+                    **metadata,
+                    "format": "sqlite",
+                    "table": table,
+                    "columns": ", ".join(column_names)
+                }
+                schema = ", ".join(f"{col[1]} {col[2]}".strip() for col in columns)
+                yield Document(
+                    page_content=f"Table: {table}\nColumns: {schema}",
+                    metadata=table_metadata
+                )
+
+                line = io.StringIO()
+                writer = csv.writer(line, lineterminator="")
+                writer.writerow(column_names)
+                header = f"Table: {table}\n{line.getvalue()}"
+
+                row_cap = self.db_row_caps.get(table, self.db_max_rows_per_table)
+                rows = self._iter_table_rows(conn, table, row_cap)
+                yield from self._group_rows(header, rows, chunk_size, table_metadata, "rowid")
+        finally:
+            conn.close()
+
+    def _iter_table_rows(self, conn: sqlite3.Connection,
+                         table: str,
+                         row_cap: Optional[int]) -> Iterator[Tuple[int, str]]:
+        """Yield (rowid, CSV line) pages using keyset pagination on rowid."""
+        line = io.StringIO()
+        writer = csv.writer(line, lineterminator="")
+        quoted = self._quote(table)
+        fetched = 0
+        last_rowid = None
+        while row_cap is None or fetched < row_cap:
+            limit = self.db_page_rows
+            if row_cap is not None:
+                limit = min(limit, row_cap - fetched)
+            try:
+                if last_rowid is None:
+                    page = conn.execute(
+                        f"SELECT rowid, * FROM {quoted} ORDER BY rowid LIMIT ?", (limit,)
+                    ).fetchall()
+                else:
+                    page = conn.execute(
+                        f"SELECT rowid, * FROM {quoted} WHERE rowid > ? ORDER BY rowid LIMIT ?",
+                        (last_rowid, limit)
+                    ).fetchall()
+            except sqlite3.OperationalError:
+                # WITHOUT ROWID tables have no rowid to page on; keep their schema only
+                return
+            if not page:
+                return
+
+            for row in page:
+                writer.writerow(row[1:])
+                yield row[0], line.getvalue()
+                line.seek(0)
+                line.truncate()
+            fetched += len(page)
+            last_rowid = page[-1][0]
+
+    @staticmethod
+    def _connect_read_only(db_path: Path) -> sqlite3.Connection:
+        """Open a SQLite file through a read-only URI so ingestion can never modify it."""
+        return sqlite3.connect(f"{Path(db_path).resolve().as_uri()}?mode=ro", uri=True)
+
+    @staticmethod
+    def _quote(identifier: str) -> str:
+        return '"' + identifier.replace('"', '""') + '"'
+
+    def _length(self, text: str) -> int:
+        return self.chunker.length(text) if self.chunker else len(text)
+
     def _chunk_content(self, content: str, 
                        chunk_size: int, 
-                       chunk_overlap: int) -> List[str]:
+                       chunk_overlap: int,
+                       fmt: str = "text") -> List[str]:
         """Split content into chunks."""
+        if self.chunker is not None:
+            return self.chunker.split_text(content, fmt)
         text_splitter = CharacterTextSplitter(
             separator="\n\n",
             chunk_size=chunk_size,
@@ -0,0 +1,78 @@
+import re
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional
+import numpy as np
+
+
+class QueryCache:
+    """Answer cache with an exact-question tier and a semantic near-duplicate tier."""
+
+    def __init__(self, similarity_threshold: float = 0.95,
+                 max_entries: int = 256):
+        self.similarity_threshold = similarity_threshold
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        # (normalized question, collection version) -> result, in LRU order
+        self._exact: "OrderedDict[tuple, Dict]" = OrderedDict()
+        self._keys: List[tuple] = []
+        self._vectors = np.empty((0, 0), dtype=np.float32)
+
+    @staticmethod
+    def normalize(question: str) -> str:
+        """Lowercase, collapse whitespace and drop trailing punctuation."""
+        question = re.sub(r"\s+", " ", question.strip().lower())
+        return question.rstrip("?!. ")
+
+    def get_exact(self, question: str, version: int) -> Optional[Dict]:
+        """Return the cached result for the same question on the same collection."""
+        key = (self.normalize(question), version)
+        with self._lock:
+            result = self._exact.get(key)
+            if result is not None:
+                self._exact.move_to_end(key)
+            return result
+
+    def get_semantic(self, embedding: List[float], version: int) -> Optional[Dict]:
+        """Return the cached result whose question embedding is closest, if close enough."""
+        with self._lock:
+            if not self._keys:
+                return None
+            query = np.asarray(embedding, dtype=np.float32)
+            norms = np.linalg.norm(self._vectors, axis=1) * np.linalg.norm(query)
+            similarities = self._vectors @ query / np.maximum(norms, 1e-12)
+            best = int(np.argmax(similarities))
+            key = self._keys[best]
+            if key[1] != version or similarities[best] < self.similarity_threshold:
+                return None
+            self._exact.move_to_end(key)
+            return self._exact[key]
+
+    def put(self, question: str, embedding: List[float],
+            version: int, result: Dict):
+        """Store a result under both tiers, evicting the least recently used entry."""
+        key = (self.normalize(question), version)
+        with self._lock:
+            if key in self._exact:
+                self._exact[key] = result
+                self._exact.move_to_end(key)
+                return
+            self._exact[key] = result
+            if len(self._exact) > self.max_entries:
+                self._exact.popitem(last=False)
+
+            # Rebuild the semantic matrix in the same order as the surviving keys
+            vectors = dict(zip(self._keys, self._vectors))
+            vectors[key] = np.asarray(embedding, dtype=np.float32)
+            self._keys = list(self._exact.keys())
+            self._vectors = np.stack([vectors[k] for k in self._keys])
+
+    def invalidate(self):
+        """Drop every entry, e.g. after the collection changed."""
+        with self._lock:
+            self._exact.clear()
+            self._keys = []
+            self._vectors = np.empty((0, 0), dtype=np.float32)
+
+    def __len__(self) -> int:
+        return len(self._exact)
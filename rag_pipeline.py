@@ -1,32 +1,83 @@
-from langchain_huggingface import HuggingFaceEmbeddings
-from langchain_ollama import OllamaLLM
-from langchain_chroma import Chroma 
 from langchain_core.prompts import ChatPromptTemplate
-from langchain_core.runnables import RunnablePassthrough 
 from langchain_core.output_parsers import StrOutputParser 
 from langchain_core.documents import Document
-from typing import List
+from langchain_core.language_models import BaseLanguageModel
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
 import os
+import threading
+import time
 import torch
 from pathlib import Path
 from dotenv import load_dotenv
+from model_registry import (
+    DEFAULT_EMBEDDING_MODEL, get_cross_encoder, get_embeddings, get_llm, get_tokenizer,
+    set_torch_threads
+)
+from embedding_cache import EmbeddingCache
+from query_cache import QueryCache
+from structured_query import TABULAR_FORMATS, StructuredQueryEngine
+from document_manifest import DocumentManifest, chunk_id
+from lexical_index import BM25Index, reciprocal_rank_fusion
+from context_packer import mmr_select, pack_context
+from vector_store import VECTOR_BACKENDS, VectorStore, create_vector_store
 
 load_dotenv()
 
 class RAGPipeline:
-    def __init__(self):
-        device = 'cuda' if torch.cuda.is_available() else 'cpu'
-        self.embeddings = HuggingFaceEmbeddings(
-            model_name="sentence-transformers/paraphrase-multilingual-mpnet-base-v2",
-            model_kwargs={"device": device },
-            encode_kwargs={"normalize_embeddings": True}
+    EMBEDDING_MODEL = DEFAULT_EMBEDDING_MODEL
+    LLM_MODEL = "phi3:mini"
+    # Multilingual like the embedding model, and small enough to run on CPU
+    RERANK_MODEL = "cross-encoder/mmarco-mMiniLMv2-L12-H384-v1"
+
+    def __init__(self, collection_name: str = "langchain",
+                 persist_directory: str = "./chroma_db",
+                 batch_size: int = 64,
+                 encode_batch_size: int = 32,
+                 num_threads: Optional[int] = None,
+                 embedding_cache_bytes: Optional[int] = 1024 ** 3,
+                 query_cache_threshold: float = 0.95,
+                 llm: Optional[BaseLanguageModel] = None,
+                 retrieval_mode: str = "hybrid",
+                 hybrid_candidates: int = 20,
+                 rrf_k: int = 60,
+                 rerank: bool = False,
+                 rerank_candidates: int = 20,
+                 rerank_budget_seconds: float = 0.5,
+                 diversify: bool = False,
+                 mmr_lambda: float = 0.7,
+                 mmr_candidates: int = 20,
+                 context_budget_tokens: Optional[int] = None,
+                 vector_backend: str = "chroma",
+                 vector_backend_options: Optional[Dict] = None,
+                 quantization: Optional[str] = None,
+                 rescore_factor: Optional[int] = None):
+        if retrieval_mode not in ("dense", "hybrid"):
+            raise ValueError(f"Unsupported retrieval mode: {retrieval_mode}")
+        if vector_backend not in VECTOR_BACKENDS:
+            raise ValueError(f"Unsupported vector backend: {vector_backend}")
+        if quantization not in (None, "int8", "binary"):
+            raise ValueError(f"Unsupported quantization: {quantization}")
+        if quantization and vector_backend != "local":
+            raise ValueError("Quantized embeddings need vector_backend=\"local\"; Chroma stores float32")
+        # Models are shared per process; only the vector collection is per session
+        self.collection_name = collection_name
+        self.persist_directory = persist_directory
+        self.num_threads = set_torch_threads(num_threads)
+        self.normalize_embeddings = True
+        self.embeddings = get_embeddings(
+            self.EMBEDDING_MODEL,
+            normalize=self.normalize_embeddings,
+            batch_size=encode_batch_size
         )
-        
-        self.llm = OllamaLLM(
-            model="phi3:mini",
-            temperature=0.3,
-            num_gpu=1 if device == 'cuda' else 0
+        # Unchanged chunks are served from disk instead of being re-encoded
+        self.embedding_cache = (
+            EmbeddingCache(persist_directory, max_bytes=embedding_cache_bytes)
+            if embedding_cache_bytes else None
         )
+        # Any LangChain LLM can be injected, e.g. a fake streaming one in tests
+        self.llm = llm if llm is not None else get_llm(self.LLM_MODEL, temperature=0.3)
         
         self.prompt = ChatPromptTemplate.from_template(""" 
             Answer the question based only on the following context:
@@ -38,101 +89,583 @@ class RAGPipeline:
             Provide a concise and accurate response.
         """)
         
-        self.vector_store = None
-        self.retriever = None
-        self.chain = None
+        # Retrieval happens once in query(); the chain only formats and generates
+        self.chain = self.prompt | self.llm | StrOutputParser()
+        self.k = 3
+        self.batch_size = batch_size
 
-    
+        # "hybrid" fuses dense and BM25 rankings so exact identifiers are not missed
+        self.retrieval_mode = retrieval_mode
+        self.hybrid_candidates = hybrid_candidates
+        self.rrf_k = rrf_k
+        self.lexical_index: Optional[BM25Index] = None
+        self._lexical_lock = threading.Lock()
+        self._lexical_ready = threading.Event()
 
-    def initialize_from_documents(self, documents: List[Document]):
-        """Initialize the RAG pipeline with documents."""
-        self.vector_store = Chroma.from_documents(
-            documents=documents,
-            embedding=self.embeddings,
-            persist_directory="./chroma_db"
-        )
-        
-        self.retriever = self.vector_store.as_retriever(
-            search_type="similarity",
-            search_kwargs={"k": 3}
+        # Optional cross-encoder pass over an over-fetched candidate list
+        self.rerank = rerank
+        self.rerank_candidates = max(rerank_candidates, self.k)
+        self.rerank_budget_seconds = rerank_budget_seconds
+        self._rerank_seconds_per_pair: Optional[float] = None
+
+        # MMR picks k chunks that are relevant but not near-copies of each other;
+        # overlapping chunks are then merged and packed into the token budget
+        self.diversify = diversify
+        self.mmr_lambda = mmr_lambda
+        self.mmr_candidates = max(mmr_candidates, self.k)
+        self.context_budget_tokens = context_budget_tokens
+
+        # "chroma" or "local" (memory-mapped HNSW/IVF, see local_vector_store.py)
+        self.vector_backend = vector_backend
+        self.vector_backend_options = dict(vector_backend_options or {})
+        if quantization:
+            # Quantized vectors are searched, then the top candidates rescored in float32
+            self.vector_backend_options.update(
+                dtype=quantization, rescore=True, rescore_factor=rescore_factor
+            )
+        self.vector_store: Optional[VectorStore] = None
+        self.last_ingest_stats = {}
+
+        # Bumped whenever the collection changes so cached answers go stale
+        self.collection_version = 0
+        self.query_cache = QueryCache(similarity_threshold=query_cache_threshold)
+        self.manifest = DocumentManifest(persist_directory)
+
+        # CSV/SQLite sources can also be answered with SQL instead of retrieval
+        self.structured = StructuredQueryEngine(
+            self.llm, cache_directory=os.path.join(persist_directory, "tabular")
         )
-        
-        self.chain = (
-            {"context": self.retriever, "question": RunnablePassthrough()}
-            | self.prompt
-            | self.llm
-            | StrOutputParser()
+
+    def initialize_from_documents(self, documents: List[Document]) -> List[str]:
+        """Initialize the RAG pipeline with documents."""
+        self.load_persisted()
+        return self.add_documents(documents)
+
+    def load_persisted(self):
+        """Attach to the vectors already persisted on disk."""
+        self.vector_store = create_vector_store(
+            self.vector_backend,
+            self.collection_name,
+            self.persist_directory,
+            self.embeddings,
+            self.vector_backend_options
         )
+        self.lexical_index = None
+        if self.retrieval_mode == "hybrid":
+            self._start_lexical_build()
+
+    def _start_lexical_build(self):
+        """Build the BM25 index in the background; queries stay dense until it is ready."""
+        index = BM25Index()
+        ready = threading.Event()
+        self._lexical_ready = ready
+        # Writes go to the index while it is built, so chunks added meanwhile are not missed
+        self.lexical_index = index
+        threading.Thread(
+            target=self._build_lexical_index,
+            args=(index, self.vector_store, ready),
+            name=f"bm25-{self.collection_name}",
+            daemon=True
+        ).start()
 
-    def add_documents(self, new_documents: List[Document]):
-        """Add new documents to existing vector store."""
+    def _build_lexical_index(self, index: BM25Index, store: VectorStore, ready: threading.Event):
+        pages = store.iter_texts(batch_size=1000)
+        try:
+            while self.lexical_index is index:
+                # Deletes take the same lock, so none can slip in between reading a page and indexing it
+                with self._lexical_lock:
+                    page = next(pages, None)
+                    if page is None:
+                        break
+                    index.add(*page)
+        except Exception:
+            # The collection was dropped or reloaded while building
+            if self.lexical_index is index:
+                raise
+            return
+        if self.lexical_index is index:
+            ready.set()
+            # Answers cached so far were retrieved without the keyword ranking
+            self.query_cache.invalidate()
+
+    def add_documents(self, new_documents: Iterable[Document],
+                      batch_size: Optional[int] = None) -> List[str]:
+        """Embed documents in batches, append them to the live store and return their IDs."""
         if self.vector_store is None:
-            self.initialize_from_documents(new_documents)
-        else:
-            # Get existing collection name
-            collection = self.vector_store._collection.name
-            
-            # Add new documents to existing Chroma collection
-            Chroma.from_documents(
-                documents=new_documents,
-                embedding=self.embeddings,
-                collection_name=collection,
-                persist_directory="./chroma_db"
-            )
-            
-            # Refresh retriever
-            self.retriever = self.vector_store.as_retriever(
-                search_type="similarity",
-                search_kwargs={"k": 3}
+            self.load_persisted()
+
+        batch_size = batch_size or self.batch_size
+        documents = iter(new_documents)
+        started = time.perf_counter()
+        ids = []
+        pending_write = None
+        with ThreadPoolExecutor(max_workers=1) as writer:
+            while True:
+                # Pulling the batch drives the preprocessor when given a generator
+                batch = list(islice(documents, batch_size))
+                if not batch:
+                    break
+                for doc in batch:
+                    if doc.metadata.get("format") in TABULAR_FORMATS:
+                        self.structured.add_source(doc.metadata["source"])
+
+                # Stable IDs make re-ingesting identical chunks an idempotent upsert
+                unique = {}
+                for doc in batch:
+                    unique.setdefault(self._chunk_id(doc), doc)
+                batch_ids = list(unique)
+                batch = list(unique.values())
+                embeddings = self._embed_documents([doc.page_content for doc in batch])
+
+                # The previous batch was written while this one was encoding
+                if pending_write is not None:
+                    pending_write.result()
+                pending_write = writer.submit(self._write_batch, batch_ids, batch, embeddings)
+                ids.extend(batch_ids)
+
+            if pending_write is not None:
+                pending_write.result()
+        elapsed = time.perf_counter() - started
+
+        if ids:
+            self._collection_changed()
+        self.last_ingest_stats = {
+            "chunks": len(ids),
+            "seconds": elapsed,
+            "chunks_per_sec": len(ids) / elapsed if elapsed > 0 else 0.0
+        }
+        if self.embedding_cache is not None:
+            self.last_ingest_stats["embedding_cache"] = self.embedding_cache.stats()
+        return ids
+
+    def _embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """Encode a batch of chunk texts, reusing cached vectors where possible."""
+        if self.embedding_cache is None:
+            return self.embeddings.embed_documents(texts)
+
+        vectors = self.embedding_cache.get_many(
+            self.EMBEDDING_MODEL, self.normalize_embeddings, texts
+        )
+        missing = [i for i, vector in enumerate(vectors) if vector is None]
+        if missing:
+            missing_texts = [texts[i] for i in missing]
+            fresh = self.embeddings.embed_documents(missing_texts)
+            for i, vector in zip(missing, fresh):
+                vectors[i] = vector
+            self.embedding_cache.put_many(
+                self.EMBEDDING_MODEL, self.normalize_embeddings, missing_texts, fresh
             )
+        return vectors
+
+    def _write_batch(self, ids: List[str],
+                     documents: List[Document],
+                     embeddings: List[List[float]]):
+        """Write pre-computed embeddings straight into the vector store."""
+        self.vector_store.upsert(ids, embeddings, documents)
+        if self.lexical_index is not None:
+            self.lexical_index.add(ids, [doc.page_content for doc in documents])
+        by_source: Dict[str, List[str]] = {}
+        for doc_id, doc in zip(ids, documents):
+            by_source.setdefault(doc.metadata.get("source", ""), []).append(doc_id)
+        for source, source_ids in by_source.items():
+            self.manifest.add_ids(self.collection_name, source, source_ids)
+
+    def update_source(self, source: str, documents: Iterable[Document]) -> Dict:
+        """Re-index one source: add only new chunks and delete the ones that disappeared.
+
+        Chunks whose text is unchanged keep their vectors, but their page and offset
+        metadata is refreshed since edits elsewhere in the file can move them.
+        """
+        if self.vector_store is None:
+            self.load_persisted()
+
+        old_ids = self.manifest.get_ids(self.collection_name, source)
+        live_ids = set()
+        kept: Dict[str, Dict] = {}
+
+        added = self.add_documents(self._changed_documents(source, documents, old_ids, live_ids, kept))
+        stale = old_ids - live_ids
+        moved = self.finish_source(source, stale, kept)
+
+        summary = {
+            "added": len(added),
+            "deleted": len(stale),
+            "unchanged": len(live_ids) - len(added),
+            "moved": moved
+        }
+        self.last_ingest_stats.update(summary)
+        return summary
+
+    def diff_source(self, source: str,
+                    documents: Iterable[Document]) -> Tuple[List[Document], Set[str], Dict[str, Dict]]:
+        """Split a source's chunks into new ones, stale stored IDs and unchanged chunk metadata.
+
+        Lets a caller embed the new chunks of several sources together before calling
+        finish_source for each of them.
+        """
+        if self.vector_store is None:
+            self.load_persisted()
+        old_ids = self.manifest.get_ids(self.collection_name, source)
+        live_ids = set()
+        kept: Dict[str, Dict] = {}
+        new_documents = list(self._changed_documents(source, documents, old_ids, live_ids, kept))
+        return new_documents, old_ids - live_ids, kept
+
+    def finish_source(self, source: str, stale: Iterable[str], kept: Dict[str, Dict]) -> int:
+        """Delete a source's stale chunks and refresh the rest; returns how many moved."""
+        self._delete_ids(source, stale)
+        return self._refresh_metadata(kept)
+
+    def _changed_documents(self, source: str,
+                           documents: Iterable[Document],
+                           old_ids: Set[str],
+                           live_ids: Set[str],
+                           kept: Dict[str, Dict]) -> Iterator[Document]:
+        """Yield chunks not stored yet, recording every live ID and the metadata of kept ones."""
+        for doc in documents:
+            doc.metadata["source"] = source
+            doc_id = self._chunk_id(doc)
+            if doc_id in live_ids:
+                continue
+            live_ids.add(doc_id)
+            if doc_id not in old_ids:
+                yield doc
+            else:
+                kept[doc_id] = doc.metadata
+
+    def _refresh_metadata(self, metadatas: Dict[str, Dict]) -> int:
+        """Rewrite the stored metadata of chunks where it differs; returns how many changed."""
+        ids = list(metadatas)
+        updated = 0
+        for start in range(0, len(ids), self.batch_size):
+            batch = ids[start:start + self.batch_size]
+            stored = self.vector_store.get_documents(batch)
+            changed = [
+                doc_id for doc_id in batch
+                if doc_id in stored and stored[doc_id].metadata != metadatas[doc_id]
+            ]
+            if changed:
+                self.vector_store.update_metadata(changed, [metadatas[doc_id] for doc_id in changed])
+                updated += len(changed)
+        if updated:
+            self._collection_changed()
+        return updated
+
+    def delete_source(self, source: str) -> int:
+        """Remove every chunk of a source from the collection."""
+        if self.vector_store is None:
+            self.load_persisted()
+        ids = self.manifest.get_ids(self.collection_name, source)
+        self._delete_ids(source, ids)
+        return len(ids)
+
+    def _delete_ids(self, source: str, ids: Iterable[str]):
+        ids = list(ids)
+        if not ids:
+            return
+        for start in range(0, len(ids), self.batch_size):
+            self.vector_store.delete(ids[start:start + self.batch_size])
+        with self._lexical_lock:
+            if self.lexical_index is not None:
+                self.lexical_index.remove(ids)
+        self.manifest.remove_ids(self.collection_name, source, ids)
+        self._collection_changed()
+
+    @staticmethod
+    def _chunk_id(doc: Document) -> str:
+        return chunk_id(doc.metadata.get("source", ""), doc.page_content)
+
+    def _collection_changed(self):
+        """Invalidate cached answers after the collection was modified."""
+        self.collection_version += 1
+        self.query_cache.invalidate()
+
+    def vector_count(self) -> int:
+        """Number of vectors stored in this pipeline's collection."""
+        if self.vector_store is None:
+            return 0
+        return self.vector_store.count()
 
     def cleanup(self):
-        """Release resources and clean up."""
+        """Release this session's collection and clean up."""
         if self.vector_store is not None:
-            self.vector_store.delete_collection()
+            self.vector_store.drop()
             self.vector_store = None
-        self.retriever = None
-        self.chain = None
+            self.manifest.drop_collection(self.collection_name)
+            self._collection_changed()
+        self._lexical_ready = threading.Event()
+        self.lexical_index = None
         torch.cuda.empty_cache()
 
-    def query(self, question: str) -> str:
-        """Query the RAG pipeline."""
-        if not self.chain:
+    def query(self, question: str) -> Dict:
+        """Query the RAG pipeline and return the complete answer."""
+        if self.vector_store is None:
             raise ValueError("Pipeline not initialized. Load documents first.")
-        
-      
+
+        result = {
+            "answer": "", "context": "", "sources": [], "timings": {}, "cache": None, "reranked": False
+        }
         try:
-        # First retrieve documents
-            docs = self.retriever.invoke(question)
-            unique_docs = []
-            seen_content = set() 
-            for doc in docs: 
-                if doc.page_content not in seen_content:
-                    seen_content.add(doc.page_content)
-                    unique_docs.append(doc)
-
-            # Format context with page info
-            context_parts = []
-            source_info = set()
-            for doc in unique_docs:
-                source = doc.metadata.get("source", "unknown")
-                source_name = Path(source).name if not source.startswith('http') else source
-                page = doc.metadata.get("page", "N/A")
-                context_parts.append(f"From {source} (page {page}):\n{doc.page_content}")
-                source_info.add(f"{source_name}, page {page}")
-            
-            # Get the answer
-            answer = self.chain.invoke(question)
-            
+            for event in self.stream_query(question):
+                if event["type"] == "context":
+                    result.update(
+                        context=event["context"],
+                        sources=event["sources"],
+                        cache=event["cache"],
+                        reranked=event["reranked"]
+                    )
+                elif event["type"] == "done":
+                    result.update(answer=event["answer"], timings=event["timings"])
+            return result
+
+        except Exception as e:
             return {
-                "answer": answer,
-                "context": "\n\n---\n\n".join(context_parts),
-                "sources": list(source_info)
+                "answer": f"Error: {str(e)}",
+                "context": "",
+                "sources": [],
+                "timings": {},
+                "cache": None,
+                "reranked": False
             }
-            
+
+    def stream_query(self, question: str) -> Iterator[Dict]:
+        """Yield the retrieved context first, then answer tokens as the LLM produces them."""
+        if self.vector_store is None:
+            raise ValueError("Pipeline not initialized. Load documents first.")
+
+        timings = {}
+        # Repeated questions against an unchanged collection skip everything
+        started = time.perf_counter()
+        cached = self.query_cache.get_exact(question, self.collection_version)
+        timings["cache"] = time.perf_counter() - started
+        if cached is not None:
+            yield from self._replay_cached(cached, "exact", timings)
+            return
+
+        # Embed the question once and search the store with that vector
+        started = time.perf_counter()
+        query_embedding = self.embeddings.embed_query(question)
+        timings["embed"] = time.perf_counter() - started
+
+        started = time.perf_counter()
+        cached = self.query_cache.get_semantic(query_embedding, self.collection_version)
+        timings["cache"] += time.perf_counter() - started
+        if cached is not None:
+            yield from self._replay_cached(cached, "semantic", timings)
+            return
+
+        candidates = self.k
+        if self.rerank:
+            candidates = max(candidates, self.rerank_candidates)
+        if self.diversify:
+            candidates = max(candidates, self.mmr_candidates)
+        docs = self._retrieve(question, query_embedding, timings, candidates)
+        reranked = False
+        if self.rerank:
+            # With MMR after it, re-ranking only reorders and leaves the cut to MMR
+            keep = len(docs) if self.diversify else self.k
+            docs, reranked = self._rerank(question, docs, timings, keep)
+        if self.diversify:
+            docs = self._diversify(query_embedding, docs, timings)
+
+        if self.diversify or self.context_budget_tokens:
+            started = time.perf_counter()
+            docs = pack_context(docs, self.context_budget_tokens, self._token_length)
+            timings["pack"] = time.perf_counter() - started
+
+        started = time.perf_counter()
+        context, sources = self._format_context(docs)
+        timings["format"] = time.perf_counter() - started
+        yield {
+            "type": "context",
+            "context": context,
+            "sources": sources,
+            "cache": None,
+            "reranked": reranked
+        }
+
+        # The LLM sees exactly the context that was yielded to the caller
+        started = time.perf_counter()
+        tokens = []
+        for token in self.chain.stream({"context": context, "question": question}):
+            if not tokens:
+                timings["first_token"] = time.perf_counter() - started
+            tokens.append(token)
+            yield {"type": "token", "text": token}
+        timings["generate"] = time.perf_counter() - started
+        timings["total"] = sum(
+            value for stage, value in timings.items() if stage != "first_token"
+        )
+
+        answer = "".join(tokens)
+        self.query_cache.put(question, query_embedding, self.collection_version, {
+            "answer": answer,
+            "context": context,
+            "sources": sources,
+            "reranked": reranked
+        })
+        yield {"type": "done", "answer": answer, "timings": timings}
+
+    def _retrieve(self, question: str,
+                  query_embedding: List[float],
+                  timings: Dict,
+                  k: int) -> List[Document]:
+        """Top-k chunks for a question, fusing dense and lexical rankings in hybrid mode."""
+        started = time.perf_counter()
+        if self.retrieval_mode == "dense" or not self._lexical_ready.is_set():
+            docs = self.vector_store.search(query_embedding, k)
+            timings["search"] = time.perf_counter() - started
+            return docs
+
+        candidates = max(self.hybrid_candidates, k)
+        dense = self.vector_store.search(query_embedding, candidates)
+        timings["search"] = time.perf_counter() - started
+
+        started = time.perf_counter()
+        lexical = self.lexical_index.search(question, candidates)
+        timings["lexical"] = time.perf_counter() - started
+
+        started = time.perf_counter()
+        by_id = {(getattr(doc, "id", None) or self._chunk_id(doc)): doc for doc in dense}
+        fused = reciprocal_rank_fusion(
+            [list(by_id), [doc_id for doc_id, _ in lexical]], k=self.rrf_k
+        )
+        top_ids = [doc_id for doc_id, _ in fused[:k]]
+        # Lexical-only hits were never loaded by the dense search
+        missing = [doc_id for doc_id in top_ids if doc_id not in by_id]
+        if missing:
+            by_id.update(self.vector_store.get_documents(missing))
+        timings["fuse"] = time.perf_counter() - started
+        return [by_id[doc_id] for doc_id in top_ids if doc_id in by_id]
+
+    def _rerank(self, question: str,
+                docs: List[Document],
+                timings: Dict,
+                keep: int) -> Tuple[List[Document], bool]:
+        """Keep the candidates the cross-encoder scores highest, within the latency budget."""
+        if len(docs) < 2:
+            return docs, False
+        # Skip instead of blowing the budget when the last runs say this would be too slow
+        if (self._rerank_seconds_per_pair is not None
+                and self._rerank_seconds_per_pair * len(docs) > self.rerank_budget_seconds):
+            # Decay the estimate so one slow spell does not disable re-ranking for good
+            self._rerank_seconds_per_pair *= 0.9
+            timings["rerank"] = 0.0
+            return docs[:keep], False
+
+        # Loading the model is a one-off cost and must not count against the budget
+        model = get_cross_encoder(self.RERANK_MODEL)
+        started = time.perf_counter()
+        scores = model.predict(
+            [(question, doc.page_content) for doc in docs], batch_size=len(docs)
+        )
+        elapsed = time.perf_counter() - started
+        timings["rerank"] = elapsed
+
+        per_pair = elapsed / len(docs)
+        self._rerank_seconds_per_pair = (
+            per_pair if self._rerank_seconds_per_pair is None
+            else 0.8 * self._rerank_seconds_per_pair + 0.2 * per_pair
+        )
+        order = sorted(range(len(docs)), key=lambda i: float(scores[i]), reverse=True)
+        return [docs[i] for i in order[:keep]], True
+
+    def _diversify(self, query_embedding: List[float],
+                   docs: List[Document],
+                   timings: Dict) -> List[Document]:
+        """Pick k candidates by maximal marginal relevance over their stored embeddings."""
+        started = time.perf_counter()
+        ids = [getattr(doc, "id", None) or self._chunk_id(doc) for doc in docs]
+        stored = self.vector_store.get_embeddings(ids)
+        vectors = [stored.get(doc_id) for doc_id in ids]
+        missing = [i for i, vector in enumerate(vectors) if vector is None]
+        if missing:
+            fresh = self._embed_documents([docs[i].page_content for i in missing])
+            for i, vector in zip(missing, fresh):
+                vectors[i] = vector
+        picked = mmr_select(query_embedding, vectors, self.k, self.mmr_lambda)
+        timings["mmr"] = time.perf_counter() - started
+        return [docs[i] for i in picked]
+
+    def _token_length(self, text: str) -> int:
+        tokenizer, _ = get_tokenizer(self.EMBEDDING_MODEL)
+        return len(tokenizer.encode(text, add_special_tokens=False))
+
+    def retrieval_settings(self) -> Dict:
+        """Per-stage retrieval configuration, e.g. for logging next to the timings."""
+        return {
+            "search": {"mode": self.retrieval_mode, "k": self.k},
+            "hybrid": {
+                "candidates": self.hybrid_candidates,
+                "rrf_k": self.rrf_k,
+                "index_ready": self._lexical_ready.is_set()
+            },
+            "rerank": {
+                "enabled": self.rerank,
+                "model": self.RERANK_MODEL,
+                "candidates": self.rerank_candidates,
+                "budget_seconds": self.rerank_budget_seconds,
+                "seconds_per_pair": self._rerank_seconds_per_pair
+            },
+            "mmr": {
+                "enabled": self.diversify,
+                "lambda": self.mmr_lambda,
+                "candidates": self.mmr_candidates
+            },
+            "pack": {"budget_tokens": self.context_budget_tokens}
+        }
+
+    def has_tabular_sources(self) -> bool:
+        """Whether any CSV or SQLite source was ingested into this pipeline."""
+        return self.structured.has_sources()
+
+    def structured_query(self, question: str) -> Dict:
+        """Answer from the ingested tables via LLM-generated, read-only SQL."""
+        try:
+            return self.structured.query(question)
         except Exception as e:
             return {
                 "answer": f"Error: {str(e)}",
+                "sql": "",
+                "columns": [],
+                "rows": [],
                 "context": "",
-                "sources": []
+                "sources": [],
+                "timings": {}
             }
+
+    def _replay_cached(self, cached: Dict, tier: str, timings: Dict) -> Iterator[Dict]:
+        """Emit a cached result through the same events as a live answer."""
+        timings["total"] = sum(timings.values())
+        yield {
+            "type": "context",
+            "context": cached["context"],
+            "sources": cached["sources"],
+            "cache": tier,
+            "reranked": cached.get("reranked", False)
+        }
+        yield {"type": "token", "text": cached["answer"]}
+        yield {"type": "done", "answer": cached["answer"], "timings": timings}
+
+    def _format_context(self, docs: List[Document]) -> Tuple[str, List[str]]:
+        """Deduplicate retrieved documents and format them with page info."""
+        unique_docs = []
+        seen_content = set()
+        for doc in docs:
+            if doc.page_content not in seen_content:
+                seen_content.add(doc.page_content)
+                unique_docs.append(doc)
+
+        context_parts = []
+        source_info = set()
+        for doc in unique_docs:
+            source = doc.metadata.get("source", "unknown")
+            source_name = Path(source).name if not source.startswith('http') else source
+            if doc.metadata.get("section"):
+                location = f"section {doc.metadata['section']}"
+            else:
+                location = f"page {doc.metadata.get('page', 'N/A')}"
+            context_parts.append(f"From {source} ({location}):\n{doc.page_content}")
+            source_info.add(f"{source_name}, {location}")
+
+        return "\n\n---\n\n".join(context_parts), list(source_info)
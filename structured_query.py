@@ -0,0 +1,223 @@
+import csv
+import hashlib
+import io
+import re
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+import pandas as pd
+from langchain_core.language_models import BaseLanguageModel
+from langchain_core.output_parsers import StrOutputParser
+from langchain_core.prompts import ChatPromptTemplate
+
+TABULAR_FORMATS = ("csv", "sqlite")
+
+
+class StructuredQueryEngine:
+    """Answers questions over CSV and SQLite sources with LLM-written SQL."""
+
+    def __init__(self, llm: BaseLanguageModel,
+                 cache_directory: str = "./chroma_db/tabular",
+                 row_limit: int = 200,
+                 timeout_seconds: float = 5.0,
+                 sample_rows: int = 3):
+        self.cache_directory = Path(cache_directory)
+        self.row_limit = row_limit
+        self.timeout_seconds = timeout_seconds
+        self.sample_rows = sample_rows
+        self._lock = threading.Lock()
+        self._pending: List[str] = []
+        self._databases: Dict[str, Path] = {}  # source -> SQLite file
+        self._schema: Optional[str] = None
+
+        self.sql_chain = ChatPromptTemplate.from_template("""
+            You write SQLite queries. Using only the tables below, write one
+            SQLite SELECT statement that answers the question.
+            {schema}
+
+            Question: {question}
+
+            Return only the SQL, without explanation or code fences.
+        """) | llm | StrOutputParser()
+
+        self.answer_chain = ChatPromptTemplate.from_template("""
+            Answer the question using only this SQL query result.
+            SQL: {sql}
+            Result:
+            {result}
+
+            Question: {question}
+
+            If the result does not answer the question, just say you don't know.
+            Provide a concise and accurate response.
+        """) | llm | StrOutputParser()
+
+    def add_source(self, source: str):
+        """Remember a tabular source; it is loaded on the first structured query."""
+        with self._lock:
+            if source not in self._databases and source not in self._pending:
+                self._pending.append(source)
+
+    def has_sources(self) -> bool:
+        with self._lock:
+            return bool(self._pending or self._databases)
+
+    def query(self, question: str) -> Dict:
+        """Generate SQL for the question, run it read-only and answer from the rows."""
+        timings = {}
+        started = time.perf_counter()
+        schema = self._load_sources()
+        timings["schema"] = time.perf_counter() - started
+        if not schema:
+            raise ValueError("No tabular sources loaded. Upload a CSV or SQLite file first.")
+
+        started = time.perf_counter()
+        sql = self._clean_sql(self.sql_chain.invoke({"schema": schema, "question": question}))
+        timings["generate_sql"] = time.perf_counter() - started
+
+        started = time.perf_counter()
+        columns, rows = self._execute(sql)
+        timings["execute"] = time.perf_counter() - started
+
+        result = self._format_rows(columns, rows)
+        started = time.perf_counter()
+        answer = self.answer_chain.invoke({"sql": sql, "result": result, "question": question})
+        timings["answer"] = time.perf_counter() - started
+        timings["total"] = sum(timings.values())
+
+        with self._lock:
+            sources = list(self._databases)
+        return {
+            "answer": answer,
+            "sql": sql,
+            "columns": columns,
+            "rows": rows,
+            "context": f"SQL: {sql}\n\n{result}",
+            "sources": [Path(source).name for source in sources],
+            "timings": timings
+        }
+
+    def _load_sources(self) -> str:
+        """Convert pending sources to SQLite files and return the cached schema."""
+        with self._lock:
+            while self._pending:
+                source = self._pending.pop(0)
+                path = Path(source)
+                if path.suffix.lower() == '.csv':
+                    self._databases[source] = self._csv_to_sqlite(path)
+                else:
+                    self._databases[source] = path
+                self._schema = None
+
+            if self._schema is None and self._databases:
+                self._schema = self._describe()
+            return self._schema or ""
+
+    def _csv_to_sqlite(self, csv_path: Path) -> Path:
+        """Load a CSV into an on-disk SQLite file, reusing it while the CSV is unchanged."""
+        stat = csv_path.stat()
+        fingerprint = f"{csv_path.resolve()}:{stat.st_size}:{stat.st_mtime_ns}"
+        db_path = self.cache_directory / f"{hashlib.sha256(fingerprint.encode()).hexdigest()[:16]}.sqlite"
+        if db_path.exists():
+            return db_path
+
+        self.cache_directory.mkdir(parents=True, exist_ok=True)
+        tmp_path = db_path.with_suffix(".tmp")
+        tmp_path.unlink(missing_ok=True)
+        table = re.sub(r"\W+", "_", csv_path.stem).strip("_") or "data"
+        conn = sqlite3.connect(tmp_path)
+        try:
+            for frame in pd.read_csv(csv_path, chunksize=50_000):
+                frame.to_sql(table, conn, if_exists="append", index=False)
+            conn.commit()
+        finally:
+            conn.close()
+        tmp_path.replace(db_path)
+        return db_path
+
+    def _connect(self) -> sqlite3.Connection:
+        """Read-only connection with every source attached under its own alias."""
+        conn = sqlite3.connect("file::memory:", uri=True, check_same_thread=False)
+        for index, db_path in enumerate(self._databases.values()):
+            conn.execute(
+                f"ATTACH DATABASE ? AS src{index}",
+                (f"{db_path.resolve().as_uri()}?mode=ro",)
+            )
+        conn.execute("PRAGMA query_only = ON")
+        return conn
+
+    def _describe(self) -> str:
+        """Schema text with a few sample rows per table, for the SQL prompt."""
+        conn = self._connect()
+        try:
+            lines = []
+            seen = set()
+            for index in range(len(self._databases)):
+                alias = f"src{index}"
+                tables = [row[0] for row in conn.execute(
+                    f"SELECT name FROM {alias}.sqlite_master "
+                    "WHERE type='table' AND name NOT LIKE 'sqlite_%' ORDER BY name"
+                )]
+                for table in tables:
+                    # SQLite resolves unqualified names across attached databases
+                    name = self._quote(table)
+                    if table in seen:
+                        name = f"{alias}.{name}"
+                    seen.add(table)
+                    columns = conn.execute(
+                        f"PRAGMA {alias}.table_info({self._quote(table)})"
+                    ).fetchall()
+                    column_list = ", ".join(f"{col[1]} {col[2]}".strip() for col in columns)
+                    lines.append(f"Table {name} ({column_list})")
+                    samples = conn.execute(
+                        f"SELECT * FROM {alias}.{self._quote(table)} LIMIT ?",
+                        (self.sample_rows,)
+                    ).fetchall()
+                    for row in samples:
+                        lines.append(f"  example row: {row}")
+            return "\n".join(lines)
+        finally:
+            conn.close()
+
+    def _execute(self, sql: str) -> Tuple[List[str], List[tuple]]:
+        """Run a query under the row limit and timeout."""
+        conn = self._connect()
+        deadline = time.perf_counter() + self.timeout_seconds
+        # A non-zero return aborts the statement with "interrupted"
+        conn.set_progress_handler(lambda: int(time.perf_counter() > deadline), 10_000)
+        try:
+            cursor = conn.execute(sql)
+            columns = [col[0] for col in cursor.description or []]
+            rows = cursor.fetchmany(self.row_limit)
+            return columns, rows
+        except sqlite3.OperationalError as e:
+            if "interrupted" in str(e):
+                raise TimeoutError(f"SQL query exceeded {self.timeout_seconds}s") from e
+            raise
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _clean_sql(text: str) -> str:
+        """Strip code fences and trailing statements, and accept only SELECT/WITH."""
+        text = re.sub(r"```(?:sql)?", "", text, flags=re.IGNORECASE).strip()
+        sql = text.split(";")[0].strip()
+        if not re.match(r"^(select|with)\b", sql, flags=re.IGNORECASE):
+            raise ValueError(f"Model did not return a SELECT query: {text[:200]}")
+        return sql
+
+    @staticmethod
+    def _format_rows(columns: List[str], rows: List[tuple]) -> str:
+        if not rows:
+            return "(no rows)"
+        out = io.StringIO()
+        writer = csv.writer(out, lineterminator="\n")
+        writer.writerow(columns)
+        writer.writerows(rows)
+        return out.getvalue().strip()
+
+    @staticmethod
+    def _quote(identifier: str) -> str:
+        return '"' + identifier.replace('"', '""') + '"'
@@ -0,0 +1,169 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import List, Optional, Union
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+
+@dataclass
+class FetchResult:
+    url: str
+    content: bytes
+    content_type: str
+    encoding: Optional[str]
+    status_code: int
+    from_cache: bool = False
+
+    @property
+    def text(self) -> str:
+        return self.content.decode(self.encoding or "utf-8", errors="replace")
+
+
+class URLFetcher:
+    """Pooled HTTP client with timeouts, size limits and conditional-GET caching."""
+
+    def __init__(self, connect_timeout: float = 5.0,
+                 read_timeout: float = 30.0,
+                 total_timeout: float = 120.0,
+                 max_bytes: int = 50 * 1024 * 1024,
+                 cache_directory: Optional[str] = "./chroma_db/url_cache",
+                 pool_size: int = 16,
+                 retries: int = 2):
+        self.timeout = (connect_timeout, read_timeout)
+        self.total_timeout = total_timeout
+        self.max_bytes = max_bytes
+        self.cache_directory = Path(cache_directory) if cache_directory else None
+        self.pool_size = pool_size
+
+        # One keep-alive session shared by every fetch, including concurrent ones
+        self.session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=pool_size,
+            pool_maxsize=pool_size,
+            max_retries=Retry(
+                total=retries,
+                backoff_factor=0.5,
+                status_forcelist=(502, 503, 504),
+                allowed_methods=("GET",)
+            )
+        )
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self._cache_lock = threading.Lock()
+
+    def fetch(self, url: str) -> FetchResult:
+        """Download a URL, streaming the body and enforcing size and time limits."""
+        cached = self._read_cache(url)
+        headers = {}
+        if cached is not None:
+            meta = cached[0]
+            if meta.get("etag"):
+                headers["If-None-Match"] = meta["etag"]
+            if meta.get("last_modified"):
+                headers["If-Modified-Since"] = meta["last_modified"]
+
+        started = time.monotonic()
+        with self.session.get(url, headers=headers, timeout=self.timeout, stream=True) as response:
+            if response.status_code == 304 and cached is not None:
+                meta, content = cached
+                return FetchResult(
+                    url=url,
+                    content=content,
+                    content_type=meta.get("content_type", ""),
+                    encoding=meta.get("encoding"),
+                    status_code=304,
+                    from_cache=True
+                )
+            response.raise_for_status()
+
+            declared = response.headers.get("Content-Length")
+            if declared and declared.isdigit() and int(declared) > self.max_bytes:
+                raise ValueError(f"{url} is {declared} bytes, over the {self.max_bytes} byte limit")
+
+            chunks = []
+            total = 0
+            for chunk in response.iter_content(chunk_size=64 * 1024):
+                total += len(chunk)
+                if total > self.max_bytes:
+                    raise ValueError(f"{url} exceeded the {self.max_bytes} byte limit")
+                # The read timeout is per socket read, so also cap the whole download
+                if time.monotonic() - started > self.total_timeout:
+                    raise TimeoutError(f"{url} took longer than {self.total_timeout}s to download")
+                chunks.append(chunk)
+
+            result = FetchResult(
+                url=url,
+                content=b"".join(chunks),
+                content_type=response.headers.get("content-type", "").lower(),
+                encoding=response.encoding,
+                status_code=response.status_code
+            )
+            self._write_cache(
+                result,
+                response.headers.get("ETag"),
+                response.headers.get("Last-Modified")
+            )
+            return result
+
+    def fetch_many(self, urls: List[str],
+                   max_workers: Optional[int] = None) -> List[Union[FetchResult, Exception]]:
+        """Fetch URLs concurrently; results keep input order, failures are returned as exceptions."""
+        def fetch_or_error(url: str) -> Union[FetchResult, Exception]:
+            try:
+                return self.fetch(url)
+            except Exception as e:
+                return e
+
+        with ThreadPoolExecutor(max_workers=max_workers or self.pool_size) as pool:
+            return list(pool.map(fetch_or_error, urls))
+
+    def close(self):
+        self.session.close()
+
+    def _cache_paths(self, url: str):
+        key = hashlib.sha256(url.encode('utf-8')).hexdigest()
+        return self.cache_directory / f"{key}.json", self.cache_directory / f"{key}.body"
+
+    def _read_cache(self, url: str):
+        if self.cache_directory is None:
+            return None
+        meta_path, body_path = self._cache_paths(url)
+        try:
+            with open(meta_path, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+            with open(body_path, 'rb') as f:
+                return meta, f.read()
+        except (OSError, json.JSONDecodeError):
+            return None
+
+    def _write_cache(self, result: FetchResult,
+                     etag: Optional[str],
+                     last_modified: Optional[str]):
+        # Only validators make a cached body reusable
+        if self.cache_directory is None or not (etag or last_modified):
+            return
+        meta_path, body_path = self._cache_paths(result.url)
+        meta = {
+            "url": result.url,
+            "etag": etag,
+            "last_modified": last_modified,
+            "content_type": result.content_type,
+            "encoding": result.encoding
+        }
+        with self._cache_lock:
+            self.cache_directory.mkdir(parents=True, exist_ok=True)
+            tmp_body = body_path.with_suffix(".body.tmp")
+            with open(tmp_body, 'wb') as f:
+                f.write(result.content)
+            os.replace(tmp_body, body_path)
+            tmp_meta = meta_path.with_suffix(".json.tmp")
+            with open(tmp_meta, 'w', encoding='utf-8') as f:
+                json.dump(meta, f)
+            os.replace(tmp_meta, meta_path)
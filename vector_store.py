@@ -0,0 +1,120 @@
+from abc import ABC, abstractmethod
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+
+VECTOR_BACKENDS = ("chroma", "local")
+
+
+class VectorStore(ABC):
+    """Storage and nearest-neighbour search for one collection of chunk vectors."""
+
+    @abstractmethod
+    def upsert(self, ids: List[str],
+               embeddings: Sequence[Sequence[float]],
+               documents: List[Document]):
+        """Insert chunks, replacing any with the same IDs."""
+
+    @abstractmethod
+    def delete(self, ids: List[str]):
+        """Remove chunks by ID; unknown IDs are ignored."""
+
+    @abstractmethod
+    def update_metadata(self, ids: List[str], metadatas: List[Dict]):
+        """Replace the metadata of stored chunks, keeping their text and vectors."""
+
+    @abstractmethod
+    def search(self, embedding: Sequence[float], k: int) -> List[Document]:
+        """The k chunks most similar to a query vector, best first."""
+
+    @abstractmethod
+    def get_documents(self, ids: List[str]) -> Dict[str, Document]:
+        """Stored chunks by ID; missing IDs are left out."""
+
+    @abstractmethod
+    def get_embeddings(self, ids: List[str]) -> Dict[str, List[float]]:
+        """Stored vectors by ID; missing IDs are left out."""
+
+    @abstractmethod
+    def iter_texts(self, batch_size: int = 10_000) -> Iterator[Tuple[List[str], List[str]]]:
+        """Yield (IDs, texts) batches covering every stored chunk."""
+
+    @abstractmethod
+    def count(self) -> int:
+        """Number of stored chunks."""
+
+    @abstractmethod
+    def drop(self):
+        """Delete the whole collection."""
+
+
+class ChromaVectorStore(VectorStore):
+    """Adapter over a persistent langchain_chroma collection."""
+
+    def __init__(self, collection_name: str,
+                 persist_directory: str,
+                 embeddings: Optional[Embeddings]):
+        from langchain_chroma import Chroma
+        self.store = Chroma(
+            collection_name=collection_name,
+            persist_directory=persist_directory,
+            embedding_function=embeddings
+        )
+
+    def upsert(self, ids, embeddings, documents):
+        # Embeddings are pre-computed, so write to the collection directly
+        self.store._collection.upsert(
+            ids=ids,
+            embeddings=embeddings,
+            metadatas=[doc.metadata for doc in documents],
+            documents=[doc.page_content for doc in documents]
+        )
+
+    def delete(self, ids):
+        self.store.delete(ids=ids)
+
+    def update_metadata(self, ids, metadatas):
+        self.store._collection.update(ids=ids, metadatas=metadatas)
+
+    def search(self, embedding, k):
+        return self.store.similarity_search_by_vector(embedding, k=k)
+
+    def get_documents(self, ids):
+        found = self.store._collection.get(ids=ids, include=["documents", "metadatas"])
+        return {
+            doc_id: Document(page_content=text or "", metadata=metadata or {})
+            for doc_id, text, metadata in zip(found["ids"], found["documents"], found["metadatas"])
+        }
+
+    def get_embeddings(self, ids):
+        found = self.store._collection.get(ids=ids, include=["embeddings"])
+        return dict(zip(found["ids"], found["embeddings"]))
+
+    def iter_texts(self, batch_size=10_000):
+        offset = 0
+        while True:
+            page = self.store._collection.get(include=["documents"], limit=batch_size, offset=offset)
+            if not page["ids"]:
+                return
+            yield page["ids"], [text or "" for text in page["documents"]]
+            offset += len(page["ids"])
+
+    def count(self):
+        return self.store._collection.count()
+
+    def drop(self):
+        self.store.delete_collection()
+
+
+def create_vector_store(backend: str,
+                        collection_name: str,
+                        persist_directory: str,
+                        embeddings: Optional[Embeddings],
+                        options: Optional[Dict] = None) -> VectorStore:
+    """Open the collection with the configured backend."""
+    if backend == "chroma":
+        return ChromaVectorStore(collection_name, persist_directory, embeddings)
+    if backend == "local":
+        from local_vector_store import LocalVectorStore
+        return LocalVectorStore.open(collection_name, persist_directory, **(options or {}))
+    raise ValueError(f"Unsupported vector backend: {backend}")